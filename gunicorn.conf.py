@@ -0,0 +1,9 @@
+# gunicorn configuration for production: see the Procfile
+
+worker_class = 'gevent'
+
+
+def post_fork(server, worker):
+    # Let other greenlets run while psycopg2 waits on the database
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -1,4 +1,9 @@
+from django.conf.urls import url
 from django.contrib import admin
+from django.http import FileResponse
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.html import format_html
 from nested_inline.admin import NestedModelAdmin
 from nested_inline.admin import NestedStackedInline
 from skillboards import models
@@ -17,17 +22,18 @@ class BoardAdmin(admin.ModelAdmin):
 
 @admin.register(models.Player)
 class PlayerAdmin(admin.ModelAdmin):
-    def get_queryset(self, request):
-        return super().get_queryset(request).with_player_info()
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        models.Board.bump_revision(obj.board_id)
 
-    def skill(self, instance):
-        return instance.skill
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        models.Board.bump_revision(obj.board_id)
 
-    def is_provisional(self, instance):
-        return instance.is_provisional
-
-    readonly_fields = ('skill', 'is_provisional')
+    readonly_fields = ('skill', 'upper_skill', 'is_provisional')
+    list_display = ('username', 'board', 'skill', 'is_provisional')
     list_filter = ['board']
+    ordering = ['board', '-skill']
 
 
 # Game models
@@ -47,3 +53,50 @@ class GameAdmin(NestedModelAdmin):
     inlines = [GameTeamInline]
     list_filter = ['board']
     ordering = ['-time']
+
+
+# Profiling
+@admin.register(models.RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created', 'method', 'path', 'status', 'duration', 'query_count', 'query_time')
+    list_filter = ['method', 'status']
+    search_fields = ['path']
+    ordering = ['-created']
+
+    fields = (
+        'created', 'method', 'path', 'status',
+        'duration', 'query_count', 'query_time',
+        'stats_file', 'formatted_queries', 'formatted_stats',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def formatted_queries(self, instance):
+        return format_html('<pre>{}</pre>', instance.queries)
+    formatted_queries.short_description = 'Slowest SQL statements'
+
+    def formatted_stats(self, instance):
+        return format_html('<pre>{}</pre>', instance.stats)
+    formatted_stats.short_description = 'Profile'
+
+    def stats_file(self, instance):
+        return format_html('<a href="stats/">{}.prof</a>', instance.pk)
+    stats_file.short_description = 'pstats dump'
+
+    def get_urls(self):
+        return [
+            url(r'^(?P<pk>\d+)/change/stats/$', self.admin_site.admin_view(self.download_stats)),
+        ] + super().get_urls()
+
+    def download_stats(self, request, pk):
+        instance = get_object_or_404(models.RequestProfile, pk=pk)
+        try:
+            stats = open(instance.stats_path(), 'rb')
+        except FileNotFoundError:
+            raise Http404('The pstats dump has been removed.')
+
+        response = FileResponse(stats, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{instance.pk}.prof"'
+        return response
@@ -0,0 +1,200 @@
+import heapq
+import math
+import random
+import time
+
+from collections import Counter
+
+import numpy as np
+
+# Searching for the fairest way to split a group of players into teams.
+# Small groups are enumerated exactly, generating each split once by never
+# trying interchangeable (equal size, still empty) teams more than once.
+# Larger groups use local search (best pairwise swap until no swap helps,
+# then restart from a perturbed split) until the time budget runs out.
+
+EXACT_LIMIT = 20000
+BATCH_SIZE = 4096
+SWAP_BATCH_SIZE = 64
+
+
+def team_sizes(player_count, team_count):
+    base, extra = divmod(player_count, team_count)
+    return [base + 1] * extra + [base] * (team_count - extra)
+
+
+def split_count(sizes):
+    count = math.factorial(sum(sizes))
+    for size in sizes:
+        count //= math.factorial(size)
+    for repeats in Counter(sizes).values():
+        count //= math.factorial(repeats)
+    return count
+
+
+# TrueSkill.quality for each row of `assignments` (the team index of every
+# player), with all weights 1. Returns an array with one quality per row.
+def split_quality(assignments, mu, sigma, team_count, beta):
+    assignments = np.asarray(assignments)
+    teams = np.arange(team_count - 1)
+
+    # Player rows of the team difference matrix, as in TrueSkill.quality
+    a = (
+        (assignments[:, :, None] == teams).astype(float)
+        - (assignments[:, :, None] == teams + 1).astype(float)
+    )
+    a_t = a.transpose(0, 2, 1)
+
+    variance = beta ** 2 + np.asarray(sigma, dtype=float) ** 2
+    start = beta ** 2 * np.matmul(a_t, a)
+    spread = np.matmul(a_t * variance, a)
+    diff = np.matmul(a_t, np.asarray(mu, dtype=float))
+
+    e_arg = -0.5 * np.einsum('pi,pi->p', diff, np.linalg.solve(spread, diff[:, :, None])[:, :, 0])
+    s_arg = np.linalg.det(start) / np.linalg.det(spread)
+    return np.exp(e_arg) * np.sqrt(s_arg)
+
+
+def _splits(sizes):
+    player_count = sum(sizes)
+    assignment = [0] * player_count
+    remaining = list(sizes)
+
+    def assign(player):
+        if player == player_count:
+            yield list(assignment)
+            return
+
+        tried_empty = set()
+        for team, size in enumerate(sizes):
+            if not remaining[team]:
+                continue
+            if remaining[team] == size:
+                if size in tried_empty:
+                    continue
+                tried_empty.add(size)
+
+            assignment[player] = team
+            remaining[team] -= 1
+            yield from assign(player + 1)
+            remaining[team] += 1
+
+    return assign(0)
+
+
+def _key(assignment):
+    teams = {}
+    for player, team in enumerate(assignment):
+        teams.setdefault(team, []).append(player)
+    return tuple(sorted(tuple(players) for players in teams.values()))
+
+
+class _Best:
+    def __init__(self, top):
+        self.top = top
+        self.heap = []
+        self.seen = set()
+
+    def add(self, quality, assignment):
+        key = _key(assignment)
+        if key in self.seen:
+            return
+        self.seen.add(key)
+
+        if len(self.heap) < self.top:
+            heapq.heappush(self.heap, (quality, key))
+        elif quality > self.heap[0][0]:
+            heapq.heapreplace(self.heap, (quality, key))
+
+    def results(self):
+        return sorted(self.heap, reverse=True)
+
+
+def _exact(sizes, mu, sigma, beta, best):
+    splits = _splits(sizes)
+    while True:
+        batch = [split for _, split in zip(range(BATCH_SIZE), splits)]
+        if not batch:
+            return
+        for quality, split in zip(split_quality(batch, mu, sigma, len(sizes), beta).tolist(), batch):
+            best.add(quality, split)
+
+
+def _swaps(assignment):
+    player_count = len(assignment)
+    return [
+        (first, second)
+        for first in range(player_count)
+        for second in range(first + 1, player_count)
+        if assignment[first] != assignment[second]
+    ]
+
+
+def _local_search(sizes, mu, sigma, beta, best, deadline, rng):
+    team_count = len(sizes)
+    player_count = len(mu)
+
+    # Start from a snake draft by mu, then restart from random perturbations
+    # of the best local optimum found so far
+    order = sorted(range(player_count), key=lambda player: -mu[player])
+    assignment = [0] * player_count
+    for index, player in enumerate(order):
+        rounds, offset = divmod(index, team_count)
+        assignment[player] = offset if rounds % 2 == 0 else team_count - 1 - offset
+
+    quality = split_quality([assignment], mu, sigma, team_count, beta)[0]
+    best.add(quality, assignment)
+    best_assignment, best_quality = assignment, quality
+
+    while time.monotonic() < deadline:
+        # Score the swaps a batch at a time, so that the deadline is also
+        # checked within one pass
+        swaps = _swaps(assignment)
+        improved = None
+        for start in range(0, len(swaps), SWAP_BATCH_SIZE):
+            if time.monotonic() >= deadline:
+                return
+
+            candidates = []
+            for first, second in swaps[start:start + SWAP_BATCH_SIZE]:
+                candidate = list(assignment)
+                candidate[first], candidate[second] = candidate[second], candidate[first]
+                candidates.append(candidate)
+
+            qualities = split_quality(candidates, mu, sigma, team_count, beta)
+            for candidate_quality, candidate in zip(qualities.tolist(), candidates):
+                best.add(candidate_quality, candidate)
+                if candidate_quality > quality:
+                    improved, quality = candidate, candidate_quality
+
+        if improved is not None:
+            assignment = improved
+            continue
+
+        if quality > best_quality:
+            best_assignment, best_quality = assignment, quality
+
+        assignment = list(best_assignment)
+        for _ in range(rng.randint(1, player_count)):
+            first, second = rng.choice(_swaps(assignment))
+            assignment[first], assignment[second] = assignment[second], assignment[first]
+        quality = split_quality([assignment], mu, sigma, team_count, beta)[0]
+        best.add(quality, assignment)
+
+
+# Returns (exact, [(quality, teams)]) for the `top` fairest splits of the
+# given ratings into `team_count` teams, where teams are tuples of indices.
+def balance(ratings, team_count, beta, top=5, time_budget=0.25):
+    mu = [rating.mu for rating in ratings]
+    sigma = [rating.sigma for rating in ratings]
+    sizes = team_sizes(len(ratings), team_count)
+    best = _Best(top)
+
+    exact = split_count(sizes) <= EXACT_LIMIT
+    if exact:
+        _exact(sizes, mu, sigma, beta, best)
+    else:
+        deadline = time.monotonic() + time_budget
+        _local_search(sizes, mu, sigma, beta, best, deadline, random.Random(0))
+
+    return exact, best.results()
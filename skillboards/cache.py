@@ -0,0 +1,94 @@
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# A per-process cache of values loaded by key. Entries are invalidated
+# explicitly when the underlying data changes in this process, and expire
+# after the number of seconds in the named setting, which bounds how long
+# other worker processes can serve stale data.
+class ProcessCache:
+    def __init__(self, timeout_setting):
+        self.timeout_setting = timeout_setting
+        self._entries = {}
+
+    def get(self, key, load):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        value = load(key)
+        self._entries[key] = (now + getattr(settings, self.timeout_setting), value)
+        return value
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+
+# A cache of rendered responses, keyed by strings that include everything
+# the response depends on (typically a board revision), so entries never
+# need to be invalidated; they're just no longer asked for. Each process
+# keeps the most recently used entries in memory, in front of Django's cache
+# framework, which is shared between processes with a shared backend.
+#
+# When an entry is missing, only one request builds it; concurrent requests
+# for the same key wait for that result (up to the lock timeout) rather than
+# all rebuilding it at once.
+class ResponseCache:
+    def __init__(self, prefix, size_setting, timeout_setting):
+        self.prefix = prefix
+        self.size_setting = size_setting
+        self.timeout_setting = timeout_setting
+        self._entries = OrderedDict()
+
+    lock_timeout = 10
+    poll_interval = 0.05
+
+    def _remember(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > getattr(settings, self.size_setting):
+            self._entries.popitem(last=False)
+        return value
+
+    def get(self, key, build):
+        key = f'{self.prefix}:{key}'
+
+        try:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        except KeyError:
+            pass
+
+        value = cache.get(key)
+        if value is not None:
+            return self._remember(key, value)
+
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, True, self.lock_timeout):
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value = cache.get(key)
+                if value is not None:
+                    return self._remember(key, value)
+                if cache.get(lock_key) is None:
+                    break
+
+        try:
+            value = build()
+            cache.set(key, value, getattr(settings, self.timeout_setting))
+        finally:
+            cache.delete(lock_key)
+
+        return self._remember(key, value)
+
+    def clear(self):
+        self._entries.clear()
@@ -1,4 +1,11 @@
+import math
+
 from collections import namedtuple
+from functools import lru_cache
+from operator import attrgetter
+
+import numpy as np
+import trueskill
 
 
 # Players should be a dict of player_name => player info
@@ -64,3 +71,161 @@ def calculate_updated_rankings(teams, env):
         for team in results
         for player_name, new_rating in team.items()
     }
+
+
+# Vectorized versions of the standard normal functions. erfc has no NumPy
+# equivalent, so it's applied element-wise; everything else is array math.
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+
+def _cdf(x):
+    return 0.5 * _erfc(-x / math.sqrt(2)).astype(float)
+
+
+def _pdf(x):
+    return np.exp(-x ** 2 / 2) / math.sqrt(2 * math.pi)
+
+
+# The draw margin quantile only depends on the environment, and the scipy ppf
+# is by far the most expensive call in a two team update.
+@lru_cache(maxsize=None)
+def _draw_quantile(ppf, draw_probability):
+    return ppf((draw_probability + 1) / 2.)
+
+
+def _rate_two_teams(env, mu, sigma, weight, side, draw):
+    # Closed-form TrueSkill update for a batch of independent two-team games.
+    # Every argument except draw is a (games, slots) array; side is +1 for
+    # players on the first (better ranked) team, -1 for the second team and
+    # 0 for unused slots. draw is a (games,) array of booleans.
+    #
+    # With only two teams the factor graph has a single truncation factor,
+    # so message passing converges in one step to exact Gaussian
+    # conditioning on the team performance difference, which is what this
+    # computes. It matches env.rate to within floating point error.
+    playing = side != 0
+    weight = np.maximum(weight, trueskill.DELTA)
+    variance = np.where(playing, sigma ** 2 + env.tau ** 2, 0)
+
+    diff_variance = np.sum(np.where(playing, weight ** 2 * (variance + env.beta ** 2), 0), axis=1)
+    c = np.sqrt(diff_variance)
+    diff = np.sum(side * weight * mu, axis=1) / c
+    draw_margin = (
+        _draw_quantile(env.ppf, env.draw_probability) *
+        np.sqrt(playing.sum(axis=1)) *
+        env.beta /
+        c
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Win
+        x = diff - draw_margin
+        denom = _cdf(x)
+        v_win = np.where(denom > 0, _pdf(x) / denom, -x)
+        w_win = v_win * (v_win + x)
+
+        # Draw
+        abs_diff = np.abs(diff)
+        a, b = draw_margin - abs_diff, -draw_margin - abs_diff
+        draw_denom = _cdf(a) - _cdf(b)
+        v_draw = np.where(draw_denom > 0, (_pdf(b) - _pdf(a)) / draw_denom, a)
+        w_draw = v_draw ** 2 + (a * _pdf(a) - b * _pdf(b)) / draw_denom
+        v_draw = np.where(diff < 0, -v_draw, v_draw)
+
+    v = np.where(draw, v_draw, v_win)
+    w = np.where(draw, w_draw, w_win)
+
+    if not np.all(np.where(draw, draw_denom > 0, (w_win > 0) & (w_win < 1))):
+        raise FloatingPointError('Cannot calculate correctly: the outcome is too unlikely for floating point')
+
+    new_mu = mu + side * weight * variance / c[:, None] * v[:, None]
+    new_variance = variance * (1 - weight ** 2 * variance / diff_variance[:, None] * w[:, None])
+
+    return new_mu, np.sqrt(new_variance)
+
+
+def _can_vectorize(teams, env):
+    return len(teams) == 2 and not callable(env.draw_probability)
+
+
+# Rate a batch of games, each a list of teams in the same format as
+# calculate_updated_rankings. The games must be independent: no player may
+# appear in more than one of them. Two team games are rated together with
+# NumPy; anything else falls back to calculate_updated_rankings.
+def calculate_updated_rankings_batch(games, env):
+    results = [None] * len(games)
+
+    vectorized = []
+    for index, teams in enumerate(games):
+        if _can_vectorize(teams, env):
+            vectorized.append(index)
+        else:
+            results[index] = calculate_updated_rankings(teams, env)
+
+    if not vectorized:
+        return results
+
+    shape = (len(vectorized), max(
+        sum(len(team.players) for team in games[index])
+        for index in vectorized
+    ))
+    mu = np.zeros(shape)
+    sigma = np.zeros(shape)
+    weight = np.zeros(shape)
+    side = np.zeros(shape)
+    draw = np.zeros(shape[0], dtype=bool)
+
+    # trueskill orders teams by rank, keeping the given order for ties
+    ordered = [sorted(games[index], key=attrgetter('rank')) for index in vectorized]
+
+    for row, (first, second) in enumerate(ordered):
+        draw[row] = first.rank == second.rank
+        slot = 0
+        for team, team_side in ((first, 1), (second, -1)):
+            for player in team.players.values():
+                mu[row, slot] = player.rating.mu
+                sigma[row, slot] = player.rating.sigma
+                weight[row, slot] = player.weight
+                side[row, slot] = team_side
+                slot += 1
+
+    new_mu, new_sigma = _rate_two_teams(env, mu, sigma, weight, side, draw)
+    new_mu, new_sigma = new_mu.tolist(), new_sigma.tolist()
+
+    for row, (index, (first, second)) in enumerate(zip(vectorized, ordered)):
+        game_results = results[index] = {}
+        slot = 0
+        for team in (first, second):
+            for player_name, player in team.players.items():
+                game_results[player_name] = PlayerResult(
+                    rating=env.create_rating(mu=new_mu[row][slot], sigma=new_sigma[row][slot]),
+                    instance=player.instance,
+                    winner=team.rank == first.rank,
+                )
+                slot += 1
+
+    return results
+
+
+def calculate_updated_rankings_vectorized(teams, env):
+    return calculate_updated_rankings_batch([teams], env)[0]
+
+
+def _quality_1vs1(mu1, variance1, mu2, variance2, env):
+    spread = 2 * env.beta ** 2 + variance1 + variance2
+    return np.sqrt(2 * env.beta ** 2 / spread) * np.exp(-(mu1 - mu2) ** 2 / (2 * spread))
+
+
+# Match quality (draw probability, as in env.quality_1vs1) of every pair of
+# players, from arrays of their mus and sigmas. Returns an N x N array.
+def quality_1vs1_matrix(mu, sigma, env):
+    mu = np.asarray(mu, dtype=float)
+    variance = np.asarray(sigma, dtype=float) ** 2
+    return _quality_1vs1(mu[:, None], variance[:, None], mu[None, :], variance[None, :], env)
+
+
+# Match quality of one rating against each of the given players
+def quality_1vs1_row(rating, mu, sigma, env):
+    mu = np.asarray(mu, dtype=float)
+    variance = np.asarray(sigma, dtype=float) ** 2
+    return _quality_1vs1(rating.mu, rating.sigma ** 2, mu, variance, env)
@@ -0,0 +1,76 @@
+import csv
+
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from skillboards.models import GameTeamPlayer
+
+# Every game of a board, oldest first, as newline-delimited JSON (in the
+# format accepted by the full_games import, plus game ids and rating deltas)
+# or as CSV with one row per participant, which can be imported too. Teams
+# in a CSV are numbered within their game, since drawn teams share a rank.
+# Rows are read with a chunked iterator (a server-side cursor on PostgreSQL)
+# and written out as they're read, so memory use doesn't grow with the size
+# of the board.
+
+CSV_COLUMNS = [
+    'game', 'time', 'team', 'rank', 'username', 'weight',
+    'mu_before', 'sigma_before', 'mu_after', 'sigma_after',
+]
+
+
+def _participants(board):
+    return (
+        GameTeamPlayer.objects
+        .filter(team__game__board=board)
+        .order_by('team__game__time', 'team__game_id', 'team__rank', 'team_id', 'pk')
+        .values_list(
+            'team__game_id', 'team__game__time', 'team_id', 'team__rank', 'player__username', 'weight',
+            'mu_before', 'sigma_before', 'mu_after', 'sigma_after',
+        )
+        .iterator()
+    )
+
+
+def export_ndjson(board):
+    encoder = DjangoJSONEncoder()
+
+    for (game_id, time), game_rows in groupby(_participants(board), key=itemgetter(0, 1)):
+        game = {
+            'id': game_id,
+            'time': time,
+            'teams': [
+                {
+                    'rank': team_rows[0][3],
+                    'players': [
+                        dict(zip(CSV_COLUMNS[4:], row[4:]))
+                        for row in team_rows
+                    ],
+                }
+                for team_rows in (list(rows) for _, rows in groupby(game_rows, key=itemgetter(2)))
+            ],
+        }
+        yield encoder.encode(game) + '\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_csv(board):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+
+    for _, game_rows in groupby(_participants(board), key=itemgetter(0)):
+        for team, (_, team_rows) in enumerate(groupby(game_rows, key=itemgetter(2))):
+            for row in team_rows:
+                yield writer.writerow((row[0], row[1].isoformat(), team) + row[3:])
+
+
+EXPORTERS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+}
@@ -0,0 +1,156 @@
+import math
+
+from functools import lru_cache
+
+import trueskill
+
+# TrueSkill environments backed by the standard library instead of scipy.
+# cdf, pdf and ppf use math.erfc, and the truncated Gaussian correction
+# functions for wins (by far the most common outcome) are read from a
+# precomputed table with cubic Hermite interpolation.
+
+BACKENDS = [
+    ('table', 'Built-in (math.erfc with lookup tables)'),
+    ('scipy', 'scipy'),
+]
+
+_SQRT2 = math.sqrt(2)
+_SQRT2PI = math.sqrt(2 * math.pi)
+
+
+def cdf(x, mu=0, sigma=1):
+    return 0.5 * math.erfc((mu - x) / (sigma * _SQRT2))
+
+
+def pdf(x, mu=0, sigma=1):
+    z = (x - mu) / sigma
+    return math.exp(-z * z / 2) / (_SQRT2PI * abs(sigma))
+
+
+# Coefficients for Acklam's rational approximation of the normal quantile,
+# which is then polished with a Halley step to full double precision.
+_PPF_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+          1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_PPF_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+          6.680131188771972e+01, -1.328068155288572e+01)
+_PPF_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+          -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_PPF_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+          3.754408661907416e+00)
+
+
+def _polynomial(coefficients, x):
+    result = 0
+    for coefficient in coefficients:
+        result = result * x + coefficient
+    return result
+
+
+def ppf(p, mu=0, sigma=1):
+    if p <= 0:
+        return -math.inf
+    if p >= 1:
+        return math.inf
+
+    if p < 0.02425:
+        q = math.sqrt(-2 * math.log(p))
+        x = _polynomial(_PPF_C, q) / (_polynomial(_PPF_D, q) * q + 1)
+    elif p > 1 - 0.02425:
+        q = math.sqrt(-2 * math.log(1 - p))
+        x = -_polynomial(_PPF_C, q) / (_polynomial(_PPF_D, q) * q + 1)
+    else:
+        q = p - 0.5
+        r = q * q
+        x = _polynomial(_PPF_A, r) * q / (_polynomial(_PPF_B, r) * r + 1)
+
+    error = cdf(x) - p
+    u = error * _SQRT2PI * math.exp(x * x / 2)
+    x = x - u / (1 + x * u / 2)
+
+    return mu + sigma * x
+
+
+def _v_win(x):
+    denom = cdf(x)
+    return (pdf(x) / denom) if denom else -x
+
+
+def _w_win(x, v):
+    return v * (v + x)
+
+
+# v and w for wins only depend on x = diff - draw_margin. Between the table
+# bounds they're interpolated from their values and exact derivatives
+# (v' = -w, w' = v(1 - w) - w(v + x)); the interpolation error is below
+# 1e-10. Outside the bounds they're computed directly.
+_TABLE_MIN = -10.0
+_TABLE_MAX = 10.0
+_TABLE_STEP = 1 / 64
+_TABLE_SIZE = int(round((_TABLE_MAX - _TABLE_MIN) / _TABLE_STEP)) + 1
+
+
+def _build_table():
+    table = []
+    for index in range(_TABLE_SIZE):
+        x = _TABLE_MIN + index * _TABLE_STEP
+        v = _v_win(x)
+        w = _w_win(x, v)
+        dv = -w
+        dw = v * (1 - w) - w * (v + x)
+        table.append((v, w, dv * _TABLE_STEP, dw * _TABLE_STEP))
+    return table
+
+
+_TABLE = _build_table()
+
+
+def _interpolate(x):
+    position = (x - _TABLE_MIN) / _TABLE_STEP
+    index = int(position)
+    t = position - index
+
+    v0, w0, dv0, dw0 = _TABLE[index]
+    v1, w1, dv1, dw1 = _TABLE[index + 1]
+
+    t2 = t * t
+    t3 = t2 * t
+    h00 = 2 * t3 - 3 * t2 + 1
+    h10 = t3 - 2 * t2 + t
+    h01 = 3 * t2 - 2 * t3
+    h11 = t3 - t2
+
+    return (
+        h00 * v0 + h10 * dv0 + h01 * v1 + h11 * dv1,
+        h00 * w0 + h10 * dw0 + h01 * w1 + h11 * dw1,
+    )
+
+
+def v_w_win(x):
+    if _TABLE_MIN <= x < _TABLE_MAX:
+        return _interpolate(x)
+
+    v = _v_win(x)
+    return v, _w_win(x, v)
+
+
+class TableTrueSkill(trueskill.TrueSkill):
+    def __init__(self, **kwargs):
+        super().__init__(backend=(cdf, pdf, ppf), **kwargs)
+
+    def v_win(self, diff, draw_margin):
+        return v_w_win(diff - draw_margin)[0]
+
+    def w_win(self, diff, draw_margin):
+        w = v_w_win(diff - draw_margin)[1]
+        if 0 < w < 1:
+            return w
+        raise FloatingPointError('Cannot calculate correctly: the outcome is too unlikely for floating point')
+
+
+# Environments are immutable in practice, so boards with the same settings
+# share one instead of building a new one on every request.
+@lru_cache(maxsize=64)
+def environ(*, backend, **kwargs):
+    if backend == 'table':
+        return TableTrueSkill(**kwargs)
+    return trueskill.TrueSkill(backend=backend, **kwargs)
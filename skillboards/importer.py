@@ -0,0 +1,169 @@
+import csv
+import json
+
+from itertools import groupby
+
+from django.db import connection
+from django.utils import timezone
+
+from skillboards.models import Game
+from skillboards.models import GameTeam
+from skillboards.models import GameTeamPlayer
+from skillboards.models import Player
+from skillboards.serializers import GameSerializer
+
+# Importing many games at once, in the same format as the full_game endpoint
+# or from a CSV export.
+# Usernames are resolved with one query per import and rows are inserted in
+# chunks. Nothing is rated here: callers replay the board's ratings once from
+# the earliest imported game.
+
+CHUNK_SIZE = 500
+CSV_REQUIRED = {'game', 'time', 'team', 'rank', 'username'}
+
+
+class ImportFailed(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def read_ndjson(lines):
+    # Yields (line number, game data) for every non-blank line
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            raise ImportFailed({number: [f'Invalid JSON: {e}']})
+
+
+def read_csv(lines):
+    # Yields (line number, game data) for every game in a CSV export, whose
+    # rows for one game, and for one team within it, are consecutive
+    reader = csv.DictReader(
+        line.decode('utf-8') if isinstance(line, bytes) else line
+        for line in lines
+    )
+    missing = CSV_REQUIRED - set(reader.fieldnames or [])
+    if missing:
+        raise ImportFailed({1: [f"Missing columns: {', '.join(sorted(missing))}"]})
+
+    rows = ((reader.line_num, row) for row in reader)
+    for _, game_rows in groupby(rows, key=lambda item: item[1]['game']):
+        game_rows = list(game_rows)
+        number, first = game_rows[0]
+
+        teams = []
+        for _, team_rows in groupby(game_rows, key=lambda item: item[1]['team']):
+            team_rows = [row for _, row in team_rows]
+            teams.append({
+                'rank': team_rows[0]['rank'],
+                'players': [
+                    {'username': row['username'], 'weight': row.get('weight') or 1}
+                    for row in team_rows
+                ],
+            })
+
+        yield number, {'time': first['time'] or None, 'teams': teams}
+
+
+READERS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def _bulk_create_with_ids(model, objects):
+    # Only some databases (PostgreSQL) set primary keys on bulk inserts
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objects)
+
+    for instance in objects:
+        instance.save(force_insert=True)
+    return objects
+
+
+def _create_games(board, games):
+    game_instances = _bulk_create_with_ids(Game, [
+        Game(board=board, time=time) for time, _ in games
+    ])
+
+    teams = [
+        (GameTeam(game=game_instance, rank=rank), players)
+        for game_instance, (_, game_teams) in zip(game_instances, games)
+        for rank, players in game_teams
+    ]
+    _bulk_create_with_ids(GameTeam, [team_instance for team_instance, _ in teams])
+
+    GameTeamPlayer.objects.bulk_create(
+        GameTeamPlayer(team=team_instance, player_id=player_id, weight=weight)
+        for team_instance, players in teams
+        for player_id, weight in players
+    )
+
+
+# Validates and inserts games given as (line number, data) pairs. Call this
+# in a transaction: if any game is invalid, ImportFailed is raised with the
+# errors by line number after checking every game. Returns the number of
+# games imported and the time of the earliest one.
+def import_games(board, games):
+    player_ids = dict(Player.objects.filter(board=board).values_list('username', 'pk'))
+    now = timezone.now()
+
+    errors = {}
+    pending = []
+    count = 0
+    earliest = None
+
+    for number, data in games:
+        serializer = GameSerializer(data=data)
+        if not serializer.is_valid():
+            errors[number] = serializer.errors
+            continue
+
+        game_teams = []
+        usernames = []
+        for team in serializer.validated_data['teams']['all']:
+            players = []
+            for player in team['players']['all']:
+                username = player['player']['username']
+                usernames.append(username)
+                players.append((player_ids.get(username), player['weight']))
+            game_teams.append((team['rank'], players))
+
+        unknown = sorted({username for username in usernames if username not in player_ids})
+        if unknown:
+            errors[number] = [f'No such player: {username}' for username in unknown]
+            continue
+        if len(set(usernames)) != len(usernames):
+            errors[number] = ['A player can only appear once in a game']
+            continue
+
+        time = serializer.validated_data['time'] or now
+        unlock_time = board.unlock_time(time)
+        if unlock_time is not None:
+            errors[number] = [f'The board is locked until {unlock_time.isoformat()}']
+            continue
+
+        earliest = time if earliest is None else min(earliest, time)
+        count += 1
+
+        if errors:
+            continue
+        pending.append((time, game_teams))
+        if len(pending) >= CHUNK_SIZE:
+            _create_games(board, pending)
+            pending = []
+
+    if errors:
+        raise ImportFailed(errors)
+
+    if pending:
+        _create_games(board, pending)
+
+    return count, earliest
@@ -0,0 +1,216 @@
+import json
+import platform
+import statistics
+import sys
+import time
+
+from datetime import timedelta
+
+import django
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.test.utils import setup_databases
+from django.test.utils import setup_test_environment
+from django.test.utils import teardown_databases
+from django.test.utils import teardown_test_environment
+from django.utils import timezone
+
+from skillboards import calculations as calc
+from skillboards.importer import import_games
+from skillboards.models import Game
+from skillboards.models import Player
+from skillboards.models import _board_cache
+from skillboards.models import _lock_cache
+from skillboards.models import update_all_rankings
+from skillboards.models import update_latest_ranking
+from skillboards.snapshot import _snapshots
+from skillboards.synthetic import Generator
+from skillboards.views import leaderboard_cache
+
+BENCHMARKS = [
+    'calculate_updated_rankings',
+    'update_latest_ranking',
+    'update_all_rankings',
+    'player_list',
+    'player_list_as',
+    'player_list_cached',
+    'full_game',
+]
+
+
+def _summary(times):
+    times = sorted(times)
+    return {
+        'runs': len(times),
+        'mean_ms': statistics.mean(times) * 1000,
+        'median_ms': statistics.median(times) * 1000,
+        'min_ms': times[0] * 1000,
+        'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        'max_ms': times[-1] * 1000,
+    }
+
+
+def _measure(run, repeat, setup=lambda: None):
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+    return _summary(times)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rating updates, replays, leaderboards and game submission on a synthetic board "
+        "in a throwaway test database, and write the results as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=200)
+        parser.add_argument('--games', type=int, default=2000)
+        parser.add_argument(
+            '--team-size', type=int, action='append', dest='team_sizes',
+            help="Players per team; repeat to mix sizes (default 1 and 2)")
+        parser.add_argument('--teams', type=int, default=2, help="Teams per game")
+        parser.add_argument('--weights', action='store_true', help="Give some players partial weights")
+        parser.add_argument(
+            '--backdate', type=float, default=0.0,
+            help="Fraction of games (generated and submitted) that are backdated")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--replay-repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--only', action='append', choices=BENCHMARKS,
+            help="Run only this benchmark; may be repeated")
+        parser.add_argument('--output', '-o', default='-', help="File to write, or - for stdout")
+
+    def handle(self, *args, output, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = self.run_benchmarks(**options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        text = json.dumps(results, indent=2, sort_keys=True) + '\n'
+        if output == '-':
+            self.stdout.write(text, ending='')
+        else:
+            with open(output, 'w') as f:
+                f.write(text)
+
+    def run_benchmarks(self, *, players, games, team_sizes, teams, weights, backdate,
+                       repeat, replay_repeat, seed, only, **options):
+        team_sizes = team_sizes or [1, 2]
+        generator = Generator(
+            players=players,
+            team_sizes=team_sizes,
+            teams=teams,
+            weights=weights,
+            backdate=backdate,
+            seed=seed,
+        )
+
+        start = time.perf_counter()
+        end = timezone.now() - timedelta(days=1)
+        board = generator.create_board('benchmark', games, end=end)
+        setup_seconds = time.perf_counter() - start
+
+        env = board.trueskill_environ()
+        client = Client()
+        selected = only or BENCHMARKS
+        results = {}
+
+        def game_teams():
+            ratings = {
+                player.username: player
+                for player in Player.objects.filter(board=board)
+            }
+            return [
+                calc.Team(rank=team['rank'], players={
+                    player['username']: calc.Player(
+                        rating=ratings[player['username']].rating,
+                        weight=player['weight'],
+                        instance=None,
+                    )
+                    for player in team['players']
+                })
+                for team in generator.teams_for_game()
+            ]
+
+        def unrated_game():
+            import_games(board, [(1, {'teams': generator.teams_for_game(), 'time': None})])
+            return Game.objects.filter(board=board).order_by('-time', '-pk').first()
+
+        # A cold read: nothing about the board is cached in this process either
+        def clear_leaderboards():
+            cache.clear()
+            leaderboard_cache.clear()
+            _board_cache.invalidate()
+            _lock_cache.invalidate()
+            _snapshots.clear()
+
+        def submission():
+            game = {'teams': generator.teams_for_game(), 'time': None}
+            if generator.random.random() < backdate:
+                game['time'] = (end - timedelta(minutes=10 * games * generator.random.random())).isoformat()
+            return json.dumps(game)
+
+        benchmarks = {
+            'calculate_updated_rankings': lambda: _measure(
+                lambda teams: calc.calculate_updated_rankings(teams, env),
+                repeat, game_teams),
+            'update_latest_ranking': lambda: _measure(
+                lambda game: update_latest_ranking(board, game),
+                repeat, unrated_game),
+            'update_all_rankings': lambda: _measure(
+                lambda _: update_all_rankings(board),
+                replay_repeat),
+            'player_list': lambda: _measure(
+                lambda _: client.get('/api/boards/benchmark/players/'),
+                repeat, clear_leaderboards),
+            'player_list_as': lambda: _measure(
+                lambda _: client.get('/api/boards/benchmark/players/', {'as': generator.usernames[0]}),
+                repeat, clear_leaderboards),
+            'player_list_cached': lambda: _measure(
+                lambda _: client.get('/api/boards/benchmark/players/'),
+                repeat),
+            'full_game': lambda: _measure(
+                lambda data: client.post('/api/boards/benchmark/full_game', data, content_type='application/json'),
+                repeat, submission),
+        }
+
+        with override_settings(RATING_RECOMPUTE_MODE='inline'):
+            for name in BENCHMARKS:
+                if name in selected:
+                    results[name] = benchmarks[name]()
+
+        return {
+            'parameters': {
+                'players': players,
+                'games': games,
+                'team_sizes': team_sizes,
+                'teams': teams,
+                'weights': weights,
+                'backdate': backdate,
+                'repeat': repeat,
+                'replay_repeat': replay_repeat,
+                'seed': seed,
+            },
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'trueskill_backend': board.backend or settings.TRUESKILL_BACKEND,
+                'platform': sys.platform,
+            },
+            'setup_seconds': setup_seconds,
+            'results': results,
+        }
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from skillboards.exporter import EXPORTERS
+from skillboards.models import Board
+
+
+class Command(BaseCommand):
+    help = "Export every game of a board, oldest first"
+
+    def add_arguments(self, parser):
+        parser.add_argument('board')
+        parser.add_argument('--format', choices=sorted(EXPORTERS), default='ndjson')
+        parser.add_argument('--output', '-o', default='-', help="File to write, or - for stdout")
+
+    def handle(self, *args, board, format, output, **options):
+        try:
+            board = Board.objects.get(pk=board)
+        except Board.DoesNotExist:
+            raise CommandError(f"No such board: {board}")
+
+        export, _ = EXPORTERS[format]
+        stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8', newline='')
+
+        try:
+            stream.writelines(export(board))
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
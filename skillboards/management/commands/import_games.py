@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+
+from skillboards.importer import ImportFailed
+from skillboards.importer import READERS
+from skillboards.importer import import_games
+from skillboards.models import Board
+from skillboards.models import update_rankings_since
+
+
+class Command(BaseCommand):
+    help = (
+        "Import games from newline-delimited JSON, one game per line, or from a CSV export, "
+        "and replay the board's ratings once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('board')
+        parser.add_argument('file', nargs='?', default='-', help="File to read, or - for stdin")
+        parser.add_argument('--format', choices=sorted(READERS), default='ndjson')
+
+    def handle(self, *args, board, file, format, **options):
+        try:
+            board = Board.objects.get(pk=board)
+        except Board.DoesNotExist:
+            raise CommandError(f"No such board: {board}")
+
+        stream = sys.stdin if file == '-' else open(file, encoding='utf-8', newline='')
+
+        try:
+            with transaction.atomic():
+                count, earliest = import_games(board, READERS[format](stream))
+                if count:
+                    update_rankings_since(board, earliest)
+        except ImportFailed as e:
+            for number, errors in sorted(e.errors.items()):
+                self.stderr.write(f"Line {number}: {errors}")
+            raise CommandError(f"{len(e.errors)} invalid games; nothing was imported")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(f"Imported {count} games")
@@ -0,0 +1,280 @@
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from collections import defaultdict
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db import transaction
+
+from skillboards.models import Board
+from skillboards.synthetic import Generator
+
+ENDPOINTS = ['player_list', 'player_detail', 'full_game', 'register']
+DEFAULT_MIX = 'player_list=60,player_detail=25,full_game=10,register=5'
+
+
+def _parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint in mix: {name} (expected one of {', '.join(ENDPOINTS)})")
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight in mix: {part}")
+    if not any(weights.values()):
+        raise CommandError("The mix needs at least one endpoint with a positive weight")
+    return weights
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Builds requests for the traffic mix, as (endpoint, method, path, body)
+class Traffic:
+    def __init__(self, board, generator, weights, seed):
+        self.board = board
+        self.generator = generator
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.registered = 0
+
+    def next_request(self):
+        with self.lock:
+            endpoint = self.random.choices(self.names, self.weights)[0]
+            return (endpoint,) + getattr(self, endpoint)()
+
+    def player_list(self):
+        path = f'/api/boards/{self.board}/players/'
+        if self.random.random() < 0.3:
+            path += '?' + urlencode({'as': self.random.choice(self.generator.usernames)})
+        return 'GET', path, None
+
+    def player_detail(self):
+        username = self.random.choice(self.generator.usernames)
+        return 'GET', f'/api/boards/{self.board}/players/{username}', None
+
+    def full_game(self):
+        game = {'teams': self.generator.teams_for_game(), 'time': None}
+        return 'POST', f'/api/boards/{self.board}/full_game', game
+
+    def register(self):
+        # Mostly new players, sometimes renaming an existing one
+        if self.random.random() < 0.7:
+            self.registered += 1
+            username = f'load{os.getpid()}x{self.registered}'
+        else:
+            username = self.random.choice(self.generator.usernames)
+        return 'POST', f'/api/boards/{self.board}/register', {
+            'username': username,
+            'print_name': f'Load {username}',
+        }
+
+
+class Worker(threading.Thread):
+    def __init__(self, host, port, traffic, deadline, results):
+        super().__init__(daemon=True)
+        self.host = host
+        self.port = port
+        self.traffic = traffic
+        self.deadline = deadline
+        self.results = results
+        self.connection = None
+
+    def request(self, method, path, body):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        try:
+            self.connection.request(method, path, body, headers)
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            endpoint, method, path, body = self.traffic.next_request()
+            start = time.perf_counter()
+            try:
+                status = self.request(method, path, body)
+            except (OSError, http.client.HTTPException) as e:
+                status = type(e).__name__
+            self.results.append((endpoint, time.perf_counter() - start, status))
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running (or locally started gunicorn/gevent) instance of the app with a mix of "
+        "leaderboard, player, game and registration requests, and report throughput, latency "
+        "percentiles and error rates per endpoint. Writes a synthetic board to the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', help="Base URL of a running server; by default gunicorn is started locally")
+        parser.add_argument('--workers', type=int, default=2, help="gunicorn workers when starting locally")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run")
+        parser.add_argument('--concurrency', type=int, default=20, help="Concurrent client connections")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Endpoint weights (default {DEFAULT_MIX})")
+        parser.add_argument('--board', default='loadtest', help="Board to create and use")
+        parser.add_argument('--players', type=int, default=200)
+        parser.add_argument('--games', type=int, default=1000, help="Games on the board before the run")
+        parser.add_argument('--team-size', type=int, action='append', dest='team_sizes')
+        parser.add_argument('--keep-board', action='store_true', help="Reuse the board if it already exists")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', dest='as_json', help="Print the report as JSON")
+
+    def handle(self, *args, url, workers, duration, concurrency, mix, board, players, games,
+               team_sizes, keep_board, seed, as_json, **options):
+        weights = _parse_mix(mix)
+        generator = Generator(players=players, team_sizes=team_sizes or [1, 2], seed=seed)
+        self.prepare_board(board, generator, games, keep_board)
+
+        server = None
+        if url is None:
+            port = _free_port()
+            server = self.start_server(port, workers)
+            host = '127.0.0.1'
+        else:
+            parts = urlsplit(url)
+            host, port = parts.hostname, parts.port or 80
+
+        try:
+            self.wait_until_ready(host, port, server)
+            results = self.run_load(host, port, Traffic(board, generator, weights, seed), duration, concurrency)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+        report = self.report(results, duration)
+        if as_json:
+            self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+        else:
+            self.print_report(report)
+
+    def prepare_board(self, name, generator, games, keep_board):
+        if Board.objects.filter(name=name).exists():
+            if not keep_board:
+                raise CommandError(f"Board {name} already exists; pass --keep-board to reuse it")
+        else:
+            with transaction.atomic():
+                generator.create_board(name, games)
+
+        # The server processes must not inherit this connection
+        connections.close_all()
+
+    def start_server(self, port, workers):
+        self.stderr.write(f"Starting gunicorn with {workers} gevent workers on port {port}")
+        return subprocess.Popen([
+            # gunicorn 19 can't be run with -m
+            sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()', 'skillserve.wsgi',
+            '--config', os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'),
+            '--worker-class', 'gevent',
+            '--workers', str(workers),
+            '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning',
+        ], env=dict(os.environ, ALLOWED_HOSTS='127.0.0.1 localhost'))
+
+    def wait_until_ready(self, host, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server is not None and server.poll() is not None:
+                raise CommandError("gunicorn exited before it was ready")
+            try:
+                connection = http.client.HTTPConnection(host, port, timeout=5)
+                connection.request('GET', '/api/poke')
+                if connection.getresponse().status == 204:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError(f"Server on {host}:{port} wasn't ready after {timeout} seconds")
+
+    def run_load(self, host, port, traffic, duration, concurrency):
+        results = []
+        deadline = time.monotonic() + duration
+        workers = [Worker(host, port, traffic, deadline, results) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def report(self, results, duration):
+        by_endpoint = defaultdict(list)
+        for endpoint, elapsed, status in results:
+            by_endpoint[endpoint].append((elapsed, status))
+
+        report = {'duration': duration, 'endpoints': {}}
+        for endpoint in ENDPOINTS + ['total']:
+            rows = results if endpoint == 'total' else [
+                (endpoint,) + row for row in by_endpoint.get(endpoint, [])
+            ]
+            if not rows:
+                continue
+
+            latencies = sorted(elapsed for _, elapsed, _ in rows)
+            errors = defaultdict(int)
+            for _, _, status in rows:
+                if not (isinstance(status, int) and status < 400):
+                    errors[str(status)] += 1
+
+            report['endpoints'][endpoint] = {
+                'requests': len(rows),
+                'throughput': len(rows) / duration,
+                'p50_ms': _percentile(latencies, 0.5) * 1000,
+                'p95_ms': _percentile(latencies, 0.95) * 1000,
+                'p99_ms': _percentile(latencies, 0.99) * 1000,
+                'error_rate': sum(errors.values()) / len(rows),
+                'errors': dict(errors),
+            }
+        return report
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'endpoint':<15}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+        )
+        for endpoint, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<15}{stats['requests']:>10}{stats['throughput']:>10.1f}"
+                f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+                f"{stats['error_rate']:>9.1%}"
+            )
+            if stats['errors']:
+                details = ', '.join(f'{status}: {count}' for status, count in sorted(stats['errors'].items()))
+                self.stdout.write(f"{'':<15}{details}")
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skillboards.models import process_recomputes
+
+
+class Command(BaseCommand):
+    help = "Run queued replays of board ratings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--watch', action='store_true',
+            help="Keep running, checking for new replays every --interval seconds")
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, watch, interval, **options):
+        while True:
+            process_recomputes()
+            if not watch:
+                break
+            time.sleep(interval)
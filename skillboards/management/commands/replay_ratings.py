@@ -0,0 +1,114 @@
+import multiprocessing
+import time
+
+import django
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import connections
+from django.db import transaction
+
+from skillboards.models import Board
+from skillboards.models import Player
+from skillboards.models import update_all_rankings
+
+
+def _init_worker():
+    django.setup()
+    # Connections inherited from the parent can't be shared between processes
+    connections.close_all()
+
+
+def _replay_board(board_name, dry_run):
+    start = time.perf_counter()
+
+    with transaction.atomic():
+        board = Board.objects.get(pk=board_name)
+        current = {
+            player[0]: player[1:]
+            for player in Player.objects.filter(board=board)
+            .values_list('pk', 'mu', 'sigma', 'games', 'wins', 'losses')
+        }
+        replay = update_all_rankings(board, dry_run=dry_run)
+
+    changed = 0
+    mu_drift = 0
+    sigma_drift = 0
+    for player_id, rating in replay.ratings.items():
+        old = current[player_id]
+        if tuple(rating) != old:
+            changed += 1
+            mu_drift = max(mu_drift, abs(rating[0] - old[0]))
+            sigma_drift = max(sigma_drift, abs(rating[1] - old[1]))
+
+    return {
+        'board': board_name,
+        'games': replay.games,
+        'players': len(replay.ratings),
+        'changed': changed,
+        'mu_drift': mu_drift,
+        'sigma_drift': sigma_drift,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+class Command(BaseCommand):
+    help = "Replay the ratings of every game on each board from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--board', action='append', dest='boards', metavar='BOARD',
+            help="Only replay this board. May be given more than once")
+        parser.add_argument(
+            '--jobs', '-j', type=int, default=1,
+            help="Number of boards to replay at once, each in its own process")
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report how far ratings would move without saving anything")
+
+    def handle(self, *args, boards, jobs, dry_run, **options):
+        if jobs < 1:
+            raise CommandError("--jobs must be at least 1")
+
+        if jobs > 1 and not dry_run and connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING(
+                "SQLite only allows one writer at a time; replaying boards one by one"))
+            jobs = 1
+
+        names = Board.objects.order_by('name').values_list('name', flat=True)
+        if boards:
+            missing = set(boards).difference(names.filter(name__in=boards))
+            if missing:
+                raise CommandError("No such board(s): " + ", ".join(sorted(missing)))
+            names = names.filter(name__in=boards)
+        names = list(names)
+
+        start = time.perf_counter()
+        tasks = [(name, dry_run) for name in names]
+
+        if jobs == 1 or len(names) < 2:
+            results = (_replay_board(*task) for task in tasks)
+            self.report(names, results)
+        else:
+            connections.close_all()
+            with multiprocessing.Pool(min(jobs, len(names)), initializer=_init_worker) as pool:
+                self.report(names, pool.imap_unordered(_replay_star, tasks))
+
+        self.stdout.write(self.style.SUCCESS(
+            "{verb} {count} board(s) in {seconds:.2f}s".format(
+                verb="Checked" if dry_run else "Replayed",
+                count=len(names),
+                seconds=time.perf_counter() - start,
+            )))
+
+    def report(self, names, results):
+        for done, result in enumerate(results, 1):
+            self.stdout.write(
+                "[{done}/{total}] {board}: {games} games, {changed}/{players} players "
+                "changed (max drift mu {mu_drift:.6g}, sigma {sigma_drift:.6g}) "
+                "in {seconds:.2f}s".format(done=done, total=len(names), **result))
+
+
+def _replay_star(task):
+    return _replay_board(*task)
@@ -0,0 +1,193 @@
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+# Request and rating engine metrics, exposed in Prometheus' text format by
+# the /metrics view. Metrics are kept per process, so with several gunicorn
+# workers each scrape only sees the worker that answered it; scrape each
+# worker (or run one) for complete numbers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, tuple(zip(self.labels, key)), value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+
+        for key, (counts, total) in values:
+            labels = tuple(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield self.name + '_bucket', labels + (('le', _format_value(float(bound))),), cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, cumulative
+
+
+request_duration = Histogram(
+    'skillserve_request_duration_seconds',
+    "Time spent handling requests",
+    labels=('view', 'method', 'status'),
+)
+request_queries = Histogram(
+    'skillserve_request_queries',
+    "SQL queries run per request",
+    labels=('view',),
+    buckets=QUERY_BUCKETS,
+)
+request_query_duration = Histogram(
+    'skillserve_request_query_duration_seconds',
+    "Time spent in SQL queries per request",
+    labels=('view',),
+)
+rating_duration = Histogram(
+    'skillserve_rating_duration_seconds',
+    "Time spent rating games",
+    labels=('function',),
+)
+rating_games = Counter(
+    'skillserve_rating_games_total',
+    "Games rated",
+    labels=('function',),
+)
+
+REGISTRY = [request_duration, request_queries, request_query_duration, rating_duration, rating_games]
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class _RatingTimer:
+    games = 0
+
+
+# Times the body as the named rating function. Set `games` on the yielded
+# object to the number of games rated.
+@contextmanager
+def rating_timer(function):
+    timer = _RatingTimer()
+    start = time.perf_counter()
+    yield timer
+
+    if settings.METRICS_ENABLED:
+        rating_duration.observe(time.perf_counter() - start, function=function)
+        rating_games.inc(timer.games, function=function)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+# Collects the SQL queries run in the body into the yielded list, by forcing
+# query logging on, as with DEBUG = True. The log is bounded, so it's emptied
+# first, unless something else (like CaptureQueriesContext) is reading it.
+@contextmanager
+def logged_queries():
+    databases = list(connections.all())
+    forced = [connection.force_debug_cursor for connection in databases]
+    for connection, force_debug_cursor in zip(databases, forced):
+        if not force_debug_cursor:
+            connection.queries_log.clear()
+        connection.force_debug_cursor = True
+    logged = [len(connection.queries_log) for connection in databases]
+
+    queries = []
+    try:
+        yield queries
+    finally:
+        for connection, count, force_debug_cursor in zip(databases, logged, forced):
+            queries.extend(list(connection.queries_log)[count:])
+            connection.force_debug_cursor = force_debug_cursor
+
+
+# Records the latency, SQL query count and SQL time of every request
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with logged_queries() as queries:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = _view_name(request)
+        request_duration.observe(elapsed, view=view, method=request.method, status=response.status_code)
+        request_queries.observe(len(queries), view=view)
+        request_query_duration.observe(sum(float(query['time']) for query in queries), view=view)
+
+        return response
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:33
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0010_auto_20170604_0326'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mu', models.FloatField()),
+                ('sigma', models.FloatField()),
+                ('games', models.PositiveIntegerField()),
+                ('wins', models.PositiveIntegerField()),
+                ('losses', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RatingCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField()),
+                ('game_count', models.PositiveIntegerField()),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='skillboards.Board')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='skillboards.Game')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='playercheckpoint',
+            name='checkpoint',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='players', to='skillboards.RatingCheckpoint'),
+        ),
+        migrations.AddField(
+            model_name='playercheckpoint',
+            name='player',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='skillboards.Player'),
+        ),
+        migrations.AlterIndexTogether(
+            name='ratingcheckpoint',
+            index_together=set([('board', 'time')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='playercheckpoint',
+            unique_together=set([('checkpoint', 'player')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='playercheckpoint',
+            index_together=set([('checkpoint', 'player')]),
+        ),
+    ]
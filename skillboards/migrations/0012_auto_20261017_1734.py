@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0011_auto_20261017_1733'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameteamplayer',
+            name='mu_after',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gameteamplayer',
+            name='mu_before',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gameteamplayer',
+            name='sigma_after',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gameteamplayer',
+            name='sigma_before',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
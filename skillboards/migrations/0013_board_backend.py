@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:38
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0012_auto_20261017_1734'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='backend',
+            field=models.CharField(blank=True, choices=[('table', 'Built-in (math.erfc with lookup tables)'), ('scipy', 'scipy'), ('mpmath', 'mpmath')], max_length=16),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0014_ratingrecompute'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingHistory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField()),
+                ('mu', models.FloatField()),
+                ('sigma', models.FloatField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='skillboards.Game')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='skillboards.Player')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='ratinghistory',
+            index_together=set([('player', 'time')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:50
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0017_game_time_default'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='game',
+            index_together=set([('board', 'time')]),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_skills(apps, schema_editor):
+    Board = apps.get_model('skillboards', 'Board')
+    Player = apps.get_model('skillboards', 'Player')
+
+    for board in Board.objects.all():
+        factor = board.mu / board.sigma
+        Player.objects.filter(board=board).update(
+            skill=models.F('mu') - models.F('sigma') * factor,
+            upper_skill=models.F('mu') + models.F('sigma') * factor,
+            is_provisional=models.Case(
+                models.When(sigma__gt=7.5, then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0018_game_board_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='is_provisional',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='skill',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='upper_skill',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='player',
+            index_together=set([('username', 'board'), ('board', 'skill', 'username')]),
+        ),
+        migrations.RunPython(fill_skills, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 17:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0019_player_skill'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.TextField()),
+                ('status', models.PositiveSmallIntegerField()),
+                ('duration', models.FloatField()),
+                ('query_count', models.PositiveIntegerField()),
+                ('query_time', models.FloatField()),
+                ('stats', models.TextField()),
+                ('queries', models.TextField()),
+            ],
+        ),
+    ]
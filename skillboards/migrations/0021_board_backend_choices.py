@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 18:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def reset_mpmath_boards(apps, schema_editor):
+    # mpmath was never installed; those boards go back to the default backend
+    Board = apps.get_model('skillboards', 'Board')
+    Board.objects.filter(backend='mpmath').update(backend='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0020_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='board',
+            name='backend',
+            field=models.CharField(blank=True, choices=[('table', 'Built-in (math.erfc with lookup tables)'), ('scipy', 'scipy')], max_length=16),
+        ),
+        migrations.RunPython(reset_mpmath_boards, migrations.RunPython.noop),
+    ]
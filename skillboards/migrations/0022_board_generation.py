@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 18:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0021_board_backend_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='generation',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-17 18:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillboards', '0022_board_generation'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='player',
+            index_together=set([('username', 'board')]),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['board', '-skill', 'username'], name='skillboards_board_i_4f5041_idx'),
+        ),
+    ]
@@ -1,20 +1,51 @@
+import os
+import threading
+import uuid
+
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
 import trueskill
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.db import models
 from django.db import transaction
 from django.db.models import Case
+from django.db.models import Exists
 from django.db.models import F
+from django.db.models import OuterRef
 from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import Value
 from django.db.models import When
 from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 
 from skillboards import calculations as calc
+from skillboards.cache import ProcessCache
+from skillboards import gaussian
+from skillboards import metrics
 from skillboards.calculations import calculate_updated_rankings
 
 
+class BoardQuerySet(models.QuerySet):
+    # Fetches what ratings_status needs along with the boards, rather than
+    # with a query per board
+    def with_ratings_status(self):
+        recomputes = RatingRecompute.objects.filter(board=OuterRef('pk'))
+        return self.annotate(
+            recompute_pending=Exists(recomputes),
+            recompute_started=Subquery(recomputes.values('started')[:1]),
+        )
+
+
 class Board(models.Model):
     name = models.SlugField(db_index=True, primary_key=True, blank=False, null=False)
 
@@ -24,27 +55,117 @@ class Board(models.Model):
     tau = models.FloatField(default=trueskill.TAU)
     draw_probability = models.FloatField(default=trueskill.DRAW_PROBABILITY)
 
+    # Blank uses the TRUESKILL_BACKEND setting
+    backend = models.CharField(max_length=16, blank=True, choices=gaussian.BACKENDS)
+
+    # Advanced by bump_revision whenever the board's players, ratings or
+    # ratings status change, so that anything derived from them can be cached
+    # by revision.
+    revision = models.PositiveIntegerField(default=0, editable=False)
+
+    # Revisions start again from 0 when a board is deleted and recreated
+    # under the same name, so caches check this too.
+    generation = models.UUIDField(default=uuid.uuid4, editable=False)
+
+    objects = BoardQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Never write back a revision that may have been read before another
+        # request bumped it.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'revision'
+            ]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def bump_revision(name):
+        Board.objects.filter(pk=name).update(revision=F('revision') + 1)
+
+    # The board's (generation, revision): anything derived from the board's
+    # players or ratings can be cached by this, in any process
+    @staticmethod
+    def current_version(name):
+        return Board.objects.filter(pk=name).values_list('generation', 'revision').get()
+
+    @property
+    def version(self):
+        return self.generation, self.revision
+
+    # Boards are read on nearly every request but rarely change, so they're
+    # cached per process. Raises Board.DoesNotExist, like objects.get. The
+    # returned instance is shared, so it must not be modified.
+    @classmethod
+    def get_cached(cls, name):
+        return _board_cache.get(name, lambda name: cls.objects.get(name=name))
+
     def trueskill_environ(self):
-        return trueskill.TrueSkill(
+        return gaussian.environ(
             mu=self.mu,
             sigma=self.sigma,
             beta=self.beta,
             tau=self.tau,
             draw_probability=self.draw_probability,
-            backend='scipy'
+            backend=self.backend or settings.TRUESKILL_BACKEND
         )
 
+    def ratings_status(self):
+        if hasattr(self, 'recompute_pending'):
+            pending, started = self.recompute_pending, self.recompute_started
+        else:
+            started = list(
+                RatingRecompute.objects
+                .filter(board=self)
+                .values_list('started', flat=True)
+            )
+            pending, started = bool(started), started[0] if started else None
+
+        if not pending:
+            return 'current'
+        elif started is None:
+            return 'stale'
+        else:
+            return 'recomputing'
+
+    def lock_schedule(self):
+        return _lock_cache.get(self.name, LockSchedule.load)
+
+    # When the lock covering `now` ends, or None if the board isn't locked
     def unlock_time(self, now=None):
         if now is None:
             now = timezone.now()
 
-        try:
-            return self.locks.filter(start__lte=now, end__gt=now).get().end
-        except BoardLock.DoesNotExist:
-            return None
+        return self.lock_schedule().unlock_time(now)
+
+
+_board_cache = ProcessCache('BOARD_CACHE_TIMEOUT')
+
+
+# Lock the board's row until the end of the transaction. Everything that
+# writes a board's ratings takes this first, so those writes are serialized
+# between processes. (SQLite has no row locks, but only ever lets one
+# transaction write anyway.)
+def lock_board(name):
+    return Board.objects.select_for_update().get(pk=name)
+
+
+@receiver(post_save, sender=Board)
+@receiver(post_delete, sender=Board)
+def invalidate_board_cache(instance, **kwargs):
+    _board_cache.invalidate(instance.name)
+    _lock_cache.invalidate(instance.name)
+
+
+@receiver(post_save, sender=Board)
+def update_skills_on_save(instance, created, **kwargs):
+    # Skills depend on the board's settings
+    if not created:
+        update_player_skills(instance)
+        Board.bump_revision(instance.name)
 
 
 class BoardLock(models.Model):
@@ -72,31 +193,65 @@ class BoardLock(models.Model):
             raise ValidationError('Locks must not overlap other locks')
 
 
-class PlayerQuerySet(models.QuerySet):
-    _skill_expression = F('mu') - (F('sigma') * (F('board__mu') / F('board__sigma')))
-    _upper_skill_expression = F('mu') + (F('sigma') * (F('board__mu') / F('board__sigma')))
-    _is_provisional_expression = Case(
-        When(sigma__gt=7.5, then=True),
-        default=False,
-        output_field=models.BooleanField(),
-    )
+# A board's locks as sorted lists of starts and ends, so finding the lock
+# covering a time is a bisect. Locks never overlap, so the ends are sorted
+# too. Cached per process like boards, and invalidated when locks change.
+class LockSchedule:
+    def __init__(self, locks):
+        locks = sorted(locks)
+        self.starts = [start for start, _ in locks]
+        self.ends = [end for _, end in locks]
+
+    @classmethod
+    def load(cls, board_name):
+        return cls(BoardLock.objects.filter(board=board_name).values_list('start', 'end'))
+
+    def unlock_time(self, when):
+        index = bisect_right(self.starts, when) - 1
+        if index >= 0 and self.ends[index] > when:
+            return self.ends[index]
+        return None
 
-    def with_skill(self):
-        return self.annotate(skill=self._skill_expression)
 
-    def with_upper_skill(self):
-        return self.annotate(upper_skill=self._upper_skill_expression)
+_lock_cache = ProcessCache('BOARD_CACHE_TIMEOUT')
 
-    def with_provisional(self):
-        return self.annotate(is_provisional=self._is_provisional_expression)
 
-    def with_player_info(self):
-        return self.with_skill().with_provisional().with_upper_skill()
+@receiver(post_save, sender=BoardLock)
+@receiver(post_delete, sender=BoardLock)
+def invalidate_lock_cache(instance, **kwargs):
+    _lock_cache.invalidate(instance.board_id)
 
+
+class PlayerQuerySet(models.QuerySet):
     def enabled(self):
         return self.filter(disabled=False)
 
 
+PROVISIONAL_SIGMA = 7.5
+
+_skill_fields = ('skill', 'upper_skill', 'is_provisional')
+
+
+def skill_columns(board, mu, sigma):
+    spread = sigma * (board.mu / board.sigma)
+    return mu - spread, mu + spread, sigma > PROVISIONAL_SIGMA
+
+
+# Recompute the stored skills of every player on the board in one statement,
+# after a change to the board's settings.
+def update_player_skills(board):
+    factor = board.mu / board.sigma
+    Player.objects.filter(board=board).update(
+        skill=F('mu') - F('sigma') * factor,
+        upper_skill=F('mu') + F('sigma') * factor,
+        is_provisional=Case(
+            When(sigma__gt=PROVISIONAL_SIGMA, then=Value(True)),
+            default=Value(False),
+            output_field=models.BooleanField(),
+        ),
+    )
+
+
 class Player(models.Model):
     username = models.SlugField(db_index=True)
     board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name="players")
@@ -110,13 +265,23 @@ class Player(models.Model):
     wins = models.PositiveIntegerField(default=0)
     losses = models.PositiveIntegerField(default=0)
 
+    # Derived from mu, sigma and the board's settings by save(), replays and
+    # update_player_skills, and stored so that leaderboards can be read in
+    # skill order from an index.
+    skill = models.FloatField(default=0, editable=False)
+    upper_skill = models.FloatField(default=0, editable=False)
+    is_provisional = models.BooleanField(default=True, editable=False)
+
     objects = PlayerQuerySet.as_manager()
 
     disabled = models.BooleanField(default=False)
 
     class Meta:
         default_manager_name = base_manager_name = "objects"
-        unique_together = index_together = ('username', 'board')
+        unique_together = ('username', 'board')
+        index_together = [('username', 'board')]
+        # In the leaderboard's order, so it can be read straight from the index
+        indexes = [models.Index(fields=['board', '-skill', 'username'])]
 
     @classmethod
     def create(cls, *, username, print_name, board):
@@ -141,8 +306,17 @@ class Player(models.Model):
         if self.sigma is None:
             self.sigma = self.board.sigma
 
+    def fill_skill(self):
+        self.skill, self.upper_skill, self.is_provisional = skill_columns(self.board, self.mu, self.sigma)
+
     def save(self, *args, **kwargs):
         self.fill_default_rank()
+        self.fill_skill()
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'mu', 'sigma'} & set(update_fields):
+            kwargs['update_fields'] = list(update_fields) + list(_skill_fields)
+
         super().save(*args, **kwargs)
 
     @property
@@ -153,10 +327,45 @@ class Player(models.Model):
     def rating(self, rating):
         self.mu, self.sigma = rating.mu, rating.sigma
 
+    # The player's place on the leaderboard, among all enabled players and
+    # among those who are no longer provisional, in the leaderboard's order
+    # (skill, then username). Each count is a range scan of the leaderboard
+    # index.
+    def standing(self):
+        if self.disabled:
+            return {'overall': None, 'established': None}
+
+        players = Player.objects.filter(board=self.board_id).enabled()
+        established = players.filter(is_provisional=False)
+
+        return {
+            'overall': self._place_in(players),
+            'established': None if self.is_provisional else self._place_in(established),
+        }
+
+    def _place_in(self, players):
+        ahead = players.filter(
+            Q(skill__gt=self.skill) |
+            Q(skill=self.skill, username__lt=self.username)
+        ).count()
+        return leaderboard_place(ahead, players.count())
+
+
+def leaderboard_place(ahead, total):
+    return {
+        'rank': ahead + 1,
+        'of': total,
+        'percentile': 100 * (total - 1 - ahead) / (total - 1) if total > 1 else 100.0,
+    }
+
 
 class Game(models.Model):
     board = models.ForeignKey(Board, on_delete=models.CASCADE)
-    time = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Not auto_now_add, which would overwrite the times of imported games
+    time = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+
+    class Meta:
+        index_together = ('board', 'time')
 
     def __str__(self):
         return (
@@ -171,8 +380,12 @@ class Game(models.Model):
             calc.Team(
                 rank=team.rank,
                 players={
-                    player.username: calc.Player(rating=player.rating, instance=player)
-                    for player in team.get_players()
+                    gplayer.player.username: calc.Player(
+                        rating=gplayer.player.rating,
+                        weight=gplayer.weight,
+                        instance=gplayer,
+                    )
+                    for gplayer in team.players.select_related('player')
                 })
             for team in self.teams.all()
         ]
@@ -180,7 +393,14 @@ class Game(models.Model):
     @classmethod
     @transaction.atomic
     def create_game(cls, *, board, teams, time=None):
+        if time is not None and time > timezone.now():
+            raise ValidationError({'time': "Games can't be in the future"})
+
+        lock_board(board.pk)
+
         game_instance = cls(board=board)
+        if time is not None:
+            game_instance.time = time
         game_instance.full_clean()
         game_instance.save()
 
@@ -194,20 +414,33 @@ class Game(models.Model):
                 player_instance.full_clean()
                 player_instance.save()
 
-        if time is None:
-            update_latest_ranking(board=board, game=game_instance)
+        if time is not None:
+            request_recompute(board.pk, time)
+        elif RatingRecompute.objects.filter(board=board).exists():
+            # The board's ratings are about to be replayed anyway; rating this
+            # game on top of them now would be overwritten by the replay.
+            request_recompute(board.pk, game_instance.time)
         else:
-            game_instance.time = time
-            game_instance.save()
-            update_all_rankings(board)
+            update_latest_ranking(board=board, game=game_instance)
+
+        Board.bump_revision(board.pk)
 
 
 def _update_ranking(board, env, game):
     teams = game.get_teams()
-    results = calculate_updated_rankings(teams, env)
+    with metrics.rating_timer('calculate_updated_rankings') as timer:
+        results = calculate_updated_rankings(teams, env)
+        timer.games = 1
 
     for result_data in results.values():
-        player_instance = result_data.instance
+        gplayer = result_data.instance
+        player_instance = gplayer.player
+
+        gplayer.rating_before = player_instance.rating
+        gplayer.rating_after = result_data.rating
+        gplayer.save(update_fields=['mu_before', 'sigma_before', 'mu_after', 'sigma_after'])
+
+        player_instance.board = board
         player_instance.rating = result_data.rating
         player_instance.games = F('games') + 1
         if result_data.winner:
@@ -216,32 +449,399 @@ def _update_ranking(board, env, game):
             player_instance.losses = F('losses') + 1
         player_instance.save()
 
+    RatingHistory.objects.bulk_create(
+        RatingHistory(
+            player_id=result_data.instance.player_id,
+            game=game,
+            time=game.time,
+            mu=result_data.rating.mu,
+            sigma=result_data.rating.sigma,
+        )
+        for result_data in results.values()
+    )
 
-@transaction.atomic
-def update_all_rankings(board):
-    # Reset all rankings
-    Player.objects.filter(board=board).update(
-        mu=board.mu,
-        sigma=board.sigma,
-        wins=0,
-        games=0,
-        losses=0
+
+def _bulk_update(model, rows, fields):
+    # Django has no bulk update, so set every field with a single CASE over
+    # the primary keys instead. Batches keep each statement under SQLite's
+    # limit of 999 query parameters.
+    rows = list(rows.items())
+    batch_size = max(1, 900 // (2 * len(fields) + 1))
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        model.objects.filter(pk__in=[pk for pk, _ in batch]).update(**{
+            field: Case(
+                *(When(pk=pk, then=Value(values[index])) for pk, values in batch),
+                output_field=model._meta.get_field(field)
+            )
+            for index, field in enumerate(fields)
+        })
+
+
+_rating_fields = ('mu', 'sigma', 'games', 'wins', 'losses')
+_delta_fields = ('mu_before', 'sigma_before', 'mu_after', 'sigma_after')
+
+
+def _save_checkpoint(board, game_id, time, game_count, ratings):
+    checkpoint = RatingCheckpoint.objects.create(
+        board=board,
+        game_id=game_id,
+        time=time,
+        game_count=game_count
+    )
+
+    PlayerCheckpoint.objects.bulk_create(
+        PlayerCheckpoint(
+            checkpoint=checkpoint,
+            player_id=player_id,
+            **dict(zip(_rating_fields, rating))
+        )
+        for player_id, rating in ratings.items()
+    )
+
+
+def _checkpoint_due(game_count):
+    interval = settings.RATING_CHECKPOINT_INTERVAL
+    return interval and not game_count % interval
+
+
+def _create_checkpoint(board, game, game_count):
+    if not _checkpoint_due(game_count):
+        return
+
+    # Players who haven't played yet are still at the board defaults, so
+    # there's no need to store them.
+    _save_checkpoint(board, game.pk, game.time, game_count, {
+        player[0]: player[1:]
+        for player in Player.objects.filter(board=board, games__gt=0)
+        .values_list('pk', *_rating_fields)
+    })
+
+
+def _after_checkpoint(checkpoint, time_field='time', game_field='game'):
+    # Filter for rows belonging to games after `checkpoint` in replay order
+    if checkpoint is None:
+        return Q()
+
+    return (
+        Q(**{time_field + '__gt': checkpoint.time}) |
+        Q(**{time_field: checkpoint.time, game_field + '__gt': checkpoint.game_id})
+    )
+
+
+def _load_games(board, checkpoint):
+    # Every participant of every game to be replayed, in replay order, in one
+    # query. Yields (game_id, time, teams), where teams is a list of
+    # (rank, [(participant_id, player_id, weight)])
+    participants = GameTeamPlayer.objects.filter(
+        _after_checkpoint(checkpoint, 'team__game__time', 'team__game'),
+        team__game__board=board,
+    )
+
+    participants = (
+        participants
+        .order_by('team__game__time', 'team__game_id', 'team_id', 'pk')
+        .values_list('team__game_id', 'team__game__time', 'team_id', 'team__rank', 'pk', 'player_id', 'weight')
+        .iterator()
     )
 
+    for (game_id, time), game_rows in groupby(participants, key=itemgetter(0, 1)):
+        yield game_id, time, [
+            (team_rows[0][3], [row[4:] for row in team_rows])
+            for team_rows in (list(rows) for _, rows in groupby(game_rows, key=itemgetter(2)))
+        ]
+
+
+def _waves(games, max_size=256):
+    # Group consecutive games into runs in which no player appears twice.
+    # Every game in a run only depends on ratings from before the run, so the
+    # run can be rated as one batch with the same result as rating its games
+    # one at a time.
+    wave = []
+    wave_players = set()
+
+    for game in games:
+        game_players = {
+            player_id
+            for _, participants in game[2]
+            for _, player_id, _ in participants
+        }
+
+        if len(wave) >= max_size or not wave_players.isdisjoint(game_players):
+            yield wave
+            wave = []
+            wave_players = set()
+
+        wave.append(game)
+        wave_players |= game_players
+
+    if wave:
+        yield wave
+
+
+class Replay(namedtuple('Replay', 'ratings deltas history checkpoints games checkpoint')):
+    __slots__ = ()
+
+
+def replay_rankings(board, checkpoint=None):
+    # Replay every game after `checkpoint` (or every game, if it's None)
+    # entirely in memory, without saving anything. Returns the new ratings
+    # (a list of mu, sigma, games, wins, losses) by player id, the rating
+    # deltas by participant id, the new rating history rows, any checkpoints
+    # reached along the way, and the number of games replayed.
     env = board.trueskill_environ()
-    for game in Game.objects.order_by('time'):
-        _update_ranking(board, env, game)
+
+    ratings = {
+        player_id: [board.mu, board.sigma, 0, 0, 0]
+        for player_id in Player.objects.filter(board=board).values_list('pk', flat=True)
+    }
+
+    if checkpoint is None:
+        game_count = 0
+    else:
+        game_count = checkpoint.game_count
+        for saved in checkpoint.players.values_list('player_id', *_rating_fields):
+            ratings[saved[0]] = list(saved[1:])
+
+    deltas = {}
+    history = []
+    checkpoints = []
+    start_count = game_count
+
+    for wave in _waves(_load_games(board, checkpoint)):
+        wave_teams = [
+            [
+                calc.Team(rank=rank, players={
+                    player_id: calc.Player(
+                        rating=trueskill.Rating(*ratings[player_id][:2]),
+                        weight=weight,
+                        instance=participant_id,
+                    )
+                    for participant_id, player_id, weight in participants
+                })
+                for rank, participants in game_teams
+            ]
+            for _, _, game_teams in wave
+        ]
+
+        with metrics.rating_timer('calculate_updated_rankings_batch') as timer:
+            wave_results = calc.calculate_updated_rankings_batch(wave_teams, env)
+            timer.games = len(wave)
+
+        for (game_id, time, _), results in zip(wave, wave_results):
+            for player_id, result in results.items():
+                rating = ratings[player_id]
+                deltas[result.instance] = (rating[0], rating[1], result.rating.mu, result.rating.sigma)
+                history.append(RatingHistory(
+                    player_id=player_id,
+                    game_id=game_id,
+                    time=time,
+                    mu=result.rating.mu,
+                    sigma=result.rating.sigma,
+                ))
+
+                rating[0], rating[1] = result.rating.mu, result.rating.sigma
+                rating[2] += 1
+                if result.winner:
+                    rating[3] += 1
+                else:
+                    rating[4] += 1
+
+            game_count += 1
+            if _checkpoint_due(game_count):
+                checkpoints.append((game_id, time, game_count, {
+                    player_id: tuple(rating)
+                    for player_id, rating in ratings.items()
+                    if rating[2]
+                }))
+
+    return Replay(
+        ratings=ratings,
+        deltas=deltas,
+        history=history,
+        checkpoints=checkpoints,
+        games=game_count - start_count,
+        checkpoint=checkpoint,
+    )
+
+
+def _save_replay(board, replay):
+    current = {
+        player[0]: player[1:]
+        for player in Player.objects.filter(board=board).values_list('pk', *_rating_fields)
+    }
+
+    _bulk_update(Player, {
+        player_id: tuple(rating) + skill_columns(board, rating[0], rating[1])
+        for player_id, rating in replay.ratings.items()
+        if tuple(rating) != current[player_id]
+    }, _rating_fields + _skill_fields)
+
+    _bulk_update(GameTeamPlayer, replay.deltas, _delta_fields)
+
+    RatingHistory.objects.filter(
+        _after_checkpoint(replay.checkpoint),
+        player__board=board,
+    ).delete()
+    RatingHistory.objects.bulk_create(replay.history)
+
+    for game_id, time, game_count, ratings in replay.checkpoints:
+        _save_checkpoint(board, game_id, time, game_count, ratings)
+
+    Board.bump_revision(board.pk)
+
+
+@transaction.atomic
+def update_all_rankings(board, *, dry_run=False):
+    with metrics.rating_timer('update_all_rankings') as timer:
+        lock_board(board.pk)
+        replay = replay_rankings(board)
+        if not dry_run:
+            board.checkpoints.all().delete()
+            _save_replay(board, replay)
+        timer.games = replay.games
+    return replay
+
+
+@transaction.atomic
+def update_rankings_since(board, time):
+    # Any checkpoint at or after `time` may be missing a backdated game, or
+    # include a deleted one, so throw those away and resume from the most
+    # recent checkpoint that's still valid.
+    with metrics.rating_timer('update_rankings_since') as timer:
+        lock_board(board.pk)
+        board.checkpoints.filter(time__gte=time).delete()
+        checkpoint = board.checkpoints.order_by('-game_count').first()
+
+        replay = replay_rankings(board, checkpoint)
+        _save_replay(board, replay)
+        timer.games = replay.games
 
 
 @transaction.atomic
 def update_latest_ranking(board, game):
     env = board.trueskill_environ()
     _update_ranking(board, env, game)
+    _create_checkpoint(board, game, Game.objects.filter(board=board).count())
+
+
+def request_recompute(board_id, since):
+    # Queue a replay of the board's ratings from `since`, merging it into the
+    # board's pending replay if there is one.
+    with transaction.atomic():
+        job, created = (
+            RatingRecompute.objects
+            .select_for_update()
+            .get_or_create(board_id=board_id, defaults={'since': since})
+        )
+        if not created:
+            job.since = min(job.since, since)
+            job.version = F('version') + 1
+            job.save(update_fields=['since', 'version'])
+
+        # The board's ratings status is part of its revision
+        Board.bump_revision(board_id)
+
+    mode = settings.RATING_RECOMPUTE_MODE
+    if mode == 'inline':
+        process_recomputes(board_id)
+    elif mode == 'background':
+        transaction.on_commit(_start_recompute_worker)
+
+
+def _run_next_recompute(board_id=None):
+    # Claim the oldest unclaimed job (or one abandoned by a dead worker),
+    # replay it, and remove it unless it was merged with a new request in the
+    # meantime. Returns False if there was nothing to do.
+    now = timezone.now()
+    abandoned = now - timedelta(seconds=settings.RATING_RECOMPUTE_TIMEOUT)
+
+    with transaction.atomic():
+        jobs = RatingRecompute.objects.select_for_update().filter(
+            Q(started__isnull=True) | Q(started__lt=abandoned)
+        )
+        if board_id is not None:
+            jobs = jobs.filter(board_id=board_id)
+
+        job = jobs.order_by('requested').first()
+        if job is None:
+            return False
+
+        job.started = now
+        job.save(update_fields=['started'])
+        Board.bump_revision(job.board_id)
+
+    with transaction.atomic():
+        update_rankings_since(Board.objects.get(pk=job.board_id), job.since)
+
+        done = RatingRecompute.objects.filter(pk=job.pk, version=job.version).delete()[0]
+        if not done:
+            RatingRecompute.objects.filter(pk=job.pk).update(started=None)
+
+    return True
+
+
+def process_recomputes(board_id=None):
+    while _run_next_recompute(board_id):
+        pass
+
+
+# One background worker per process. Every request for it sets
+# _recompute_wanted, and the worker only exits once it has found the flag
+# clear, under the same lock, so a job queued while the worker is finishing
+# isn't left waiting for the next request.
+_recompute_lock = threading.Lock()
+_recompute_worker = None
+_recompute_wanted = False
+
+
+def _recompute_worker_main():
+    global _recompute_worker, _recompute_wanted
+    try:
+        while True:
+            with _recompute_lock:
+                if not _recompute_wanted:
+                    _recompute_worker = None
+                    return
+                _recompute_wanted = False
+
+            process_recomputes()
+    finally:
+        with _recompute_lock:
+            if _recompute_worker is threading.current_thread():
+                _recompute_worker = None
+        connection.close()
+
+
+def _start_recompute_worker():
+    # Under gunicorn's gevent worker, threading is monkey patched and this is
+    # a greenlet.
+    global _recompute_worker, _recompute_wanted
+    with _recompute_lock:
+        _recompute_wanted = True
+        if _recompute_worker is not None:
+            return
+
+        _recompute_worker = threading.Thread(target=_recompute_worker_main, daemon=True)
+        _recompute_worker.start()
 
 
 @receiver(post_delete, sender=Game)
 def update_rankings_on_delete(instance, **kwargs):
-    update_all_rankings(instance.board)
+    request_recompute(instance.board_id, instance.time)
+
+
+# A board whose ratings need to be replayed from `since`, because of a
+# backdated or deleted game. There's at most one per board: new requests are
+# merged into it, bumping its version, so a burst of deletions only causes a
+# single replay.
+class RatingRecompute(models.Model):
+    board = models.OneToOneField(Board, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    since = models.DateTimeField()
+    requested = models.DateTimeField(default=timezone.now, db_index=True)
+    started = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=0)
 
 
 class GameTeam(models.Model):
@@ -251,10 +851,6 @@ class GameTeam(models.Model):
     def __str__(self):
         return ', '.join(p.player.username for p in self.players.all()) + f' (rank {self.rank})'
 
-    def get_players(self):
-        for gplayer in self.players.select_related('player'):
-            yield gplayer.player
-
 
 def validate_weight(value):
     if not 0 <= value <= 1:
@@ -269,5 +865,103 @@ class GameTeamPlayer(models.Model):
     player = models.ForeignKey(Player, on_delete=models.PROTECT)
     weight = models.FloatField(validators=[validate_weight], default=1)
 
+    # The player's rating immediately before and after this game. These are
+    # written whenever the game is rated, including during replays.
+    mu_before = models.FloatField(null=True, blank=True)
+    sigma_before = models.FloatField(null=True, blank=True)
+    mu_after = models.FloatField(null=True, blank=True)
+    sigma_after = models.FloatField(null=True, blank=True)
+
     class Meta:
         unique_together = index_together = ('team', 'player')
+
+    @property
+    def rating_before(self):
+        return trueskill.Rating(mu=self.mu_before, sigma=self.sigma_before)
+
+    @rating_before.setter
+    def rating_before(self, rating):
+        self.mu_before, self.sigma_before = rating.mu, rating.sigma
+
+    @property
+    def rating_after(self):
+        return trueskill.Rating(mu=self.mu_after, sigma=self.sigma_after)
+
+    @rating_after.setter
+    def rating_after(self, rating):
+        self.mu_after, self.sigma_after = rating.mu, rating.sigma
+
+
+# Snapshots of every player's rating on a board, taken every
+# RATING_CHECKPOINT_INTERVAL games, so that a backdated or deleted game only
+# requires replaying the games after the nearest earlier checkpoint.
+class RatingCheckpoint(models.Model):
+    board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='checkpoints')
+
+    # The last game included in the checkpoint, in (time, id) order
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+')
+    time = models.DateTimeField()
+    game_count = models.PositiveIntegerField()
+
+    class Meta:
+        index_together = ('board', 'time')
+
+
+class PlayerCheckpoint(models.Model):
+    checkpoint = models.ForeignKey(RatingCheckpoint, on_delete=models.CASCADE, related_name='players')
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='+')
+
+    mu = models.FloatField()
+    sigma = models.FloatField()
+
+    games = models.PositiveIntegerField()
+    wins = models.PositiveIntegerField()
+    losses = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = index_together = ('checkpoint', 'player')
+
+
+# Every player's rating after each of their games. This duplicates the
+# after values on GameTeamPlayer, but with the game time alongside, so a
+# player's history over a time range is a single index range scan.
+class RatingHistory(models.Model):
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='history')
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+')
+    time = models.DateTimeField()
+
+    mu = models.FloatField()
+    sigma = models.FloatField()
+
+    class Meta:
+        index_together = ('player', 'time')
+
+
+# A request profiled by skillboards.profiling.ProfilingMiddleware. The full
+# pstats dump is kept on disk alongside, and removed with the record.
+class RequestProfile(models.Model):
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    status = models.PositiveSmallIntegerField()
+
+    duration = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_time = models.FloatField()
+
+    stats = models.TextField()
+    queries = models.TextField()
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.created})'
+
+    def stats_path(self):
+        return os.path.join(settings.PROFILE_DIR, f'{self.pk}.prof')
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_stats(instance, **kwargs):
+    try:
+        os.remove(instance.stats_path())
+    except FileNotFoundError:
+        pass
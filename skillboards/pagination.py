@@ -0,0 +1,46 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Keyset pagination over (time, id), newest first. A cursor encodes the time
+# and id of the last item on the previous page, so fetching any page is an
+# index range scan rather than counting past OFFSET rows.
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(time, pk):
+    data = json.dumps([time.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        time, pk = json.loads(data.decode())
+        time = parse_datetime(time)
+    except (TypeError, ValueError):
+        raise InvalidCursor(cursor)
+
+    if time is None or not isinstance(pk, int):
+        raise InvalidCursor(cursor)
+    return time, pk
+
+
+# Returns a page of `queryset` (which must have time and id fields) after
+# `cursor`, and the cursor for the next page, or None if this is the last.
+def keyset_page(queryset, cursor, limit):
+    if cursor is not None:
+        time, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(time__lt=time) | Q(time=time, pk__lt=pk))
+
+    items = list(queryset.order_by('-time', '-pk')[:limit + 1])
+    if len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    return items, encode_cursor(items[-1].time, items[-1].pk)
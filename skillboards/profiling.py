@@ -0,0 +1,101 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+
+from collections import defaultdict
+
+from django.conf import settings
+
+from skillboards.metrics import logged_queries
+from skillboards.models import RequestProfile
+
+# Profiling single requests on demand. When PROFILING_ENABLED is set, a
+# request from a staff user with an `X-Profile: 1` header or a `profile=1`
+# query parameter runs under cProfile. The raw pstats dump is written to
+# PROFILE_DIR, and a RequestProfile with a summary of the slowest functions
+# and SQL statements is saved for browsing in the admin. Only the newest
+# PROFILE_KEEP profiles are kept.
+
+TOP_FUNCTIONS = 40
+TOP_STATEMENTS = 15
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def _wants_profile(request):
+    if not settings.PROFILING_ENABLED:
+        return False
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        return False
+
+    return request.META.get('HTTP_X_PROFILE') == '1' or request.GET.get('profile') == '1'
+
+
+def summarize_queries(queries, top=TOP_STATEMENTS):
+    # Group statements that only differ in their literal values
+    statements = defaultdict(lambda: [0, 0.0])
+    for query in queries:
+        statement = statements[_literals.sub('?', query['sql'])]
+        statement[0] += 1
+        statement[1] += float(query['time'])
+
+    lines = []
+    for sql, (count, total) in sorted(statements.items(), key=lambda item: -item[1][1])[:top]:
+        lines.append(f'{total * 1000:9.1f} ms {count:6d} x  {sql}')
+    return '\n'.join(lines)
+
+
+def summarize_stats(profile, top=TOP_FUNCTIONS):
+    output = io.StringIO()
+    stats = pstats.Stats(profile, stream=output)
+    stats.sort_stats('cumulative').print_stats(top)
+    return output.getvalue()
+
+
+def _save(request, response, profile, queries, duration):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+
+    record = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path(),
+        status=response.status_code,
+        duration=duration,
+        query_count=len(queries),
+        query_time=sum(float(query['time']) for query in queries),
+        stats=summarize_stats(profile),
+        queries=summarize_queries(queries),
+    )
+    profile.dump_stats(record.stats_path())
+
+    for old in RequestProfile.objects.order_by('-created', '-pk')[settings.PROFILE_KEEP:]:
+        old.delete()
+
+    return record
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _wants_profile(request):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        with logged_queries() as queries:
+            profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+        duration = time.perf_counter() - start
+
+        record = _save(request, response, profile, queries, duration)
+        response['X-Profile-Id'] = str(record.pk)
+        return response
@@ -1,12 +1,10 @@
+from django.utils import timezone
 from rest_framework import serializers
 
 from skillboards import models
 
 
 class PlayerSerializer(serializers.ModelSerializer):
-    skill = serializers.FloatField(read_only=True)
-    upper_skill = serializers.FloatField(read_only=True)
-    is_provisional = serializers.BooleanField(read_only=True)
     quality = serializers.FloatField(
         read_only=True,
         required=False
@@ -33,6 +31,16 @@ class PlayerSerializer(serializers.ModelSerializer):
         ]
 
 
+class PlayerDetailSerializer(PlayerSerializer):
+    standing = serializers.SerializerMethodField()
+
+    class Meta(PlayerSerializer.Meta):
+        fields = PlayerSerializer.Meta.fields + ["standing"]
+
+    def get_standing(self, player):
+        return player.standing()
+
+
 class BoardSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Board
@@ -44,11 +52,20 @@ class BoardSerializer(serializers.ModelSerializer):
             "beta",
             "tau",
             "draw_probability",
+            "backend",
 
             "unlock_time",
+            "ratings_status",
         ]
 
 
+class PlayerListQuerySerializer(serializers.Serializer):
+    # `as` is a keyword, so the viewer's username is read from request.GET
+    limit = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    offset = serializers.IntegerField(min_value=0, default=0)
+    top = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+
+
 class PlayerRegisterSerializer(serializers.Serializer):
     username = serializers.SlugField()
     print_name = serializers.CharField(
@@ -60,7 +77,12 @@ class GameSerializer(serializers.Serializer):
     class TeamSerializer(serializers.Serializer):
         class PlayerSerializer(serializers.Serializer):
             username = serializers.SlugField(source='player.username')
-            weight = serializers.FloatField(default=1)
+            weight = serializers.FloatField(default=1, min_value=0, max_value=1)
+
+            mu_before = serializers.FloatField(read_only=True)
+            sigma_before = serializers.FloatField(read_only=True)
+            mu_after = serializers.FloatField(read_only=True)
+            sigma_after = serializers.FloatField(read_only=True)
 
             def to_internal_value(self, data):
                 if isinstance(data, str):
@@ -73,9 +95,57 @@ class GameSerializer(serializers.Serializer):
             source="players.all")
         rank = serializers.IntegerField(min_value=0)
 
+    id = serializers.IntegerField(read_only=True)
     teams = serializers.ListField(
         child=TeamSerializer(),
         min_length=2,
         source="teams.all"
     )
     time = serializers.DateTimeField(allow_null=True, required=False, default=None)
+
+    def validate_time(self, value):
+        # Ratings are replayed in time order, so a game from the future would
+        # be rated before games played in the meantime
+        if value is not None and value > timezone.now():
+            raise serializers.ValidationError("Games can't be in the future")
+        return value
+
+
+class HistoryQuerySerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    points = serializers.IntegerField(min_value=2, max_value=5000, default=500)
+
+
+class QualityQuerySerializer(serializers.Serializer):
+    top = serializers.IntegerField(min_value=1, required=False)
+
+
+class BalanceSerializer(serializers.Serializer):
+    # Local search scores every pairwise swap on each step, so groups are capped
+    players = serializers.ListField(child=serializers.SlugField(), min_length=2, max_length=24)
+    teams = serializers.IntegerField(min_value=2, default=2)
+    team_size = serializers.IntegerField(min_value=1, required=False)
+    top = serializers.IntegerField(min_value=1, max_value=50, default=5)
+
+    def validate(self, data):
+        if len(set(data['players'])) != len(data['players']):
+            raise serializers.ValidationError({'players': 'Players must be unique'})
+
+        if 'team_size' in data:
+            teams, extra = divmod(len(data['players']), data['team_size'])
+            if extra or teams < 2:
+                raise serializers.ValidationError({
+                    'team_size': 'Players must split evenly into at least two teams'
+                })
+            data['teams'] = teams
+
+        if data['teams'] > len(data['players']):
+            raise serializers.ValidationError({'teams': 'More teams than players'})
+
+        return data
+
+
+class GamePageQuerySerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=200, default=50)
@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from skillboards.models import Board
+from skillboards.models import Player
+from skillboards.models import leaderboard_place
+from skillboards.serializers import BoardSerializer
+from skillboards.serializers import PlayerSerializer
+
+# Each process keeps a read-only snapshot of every board it serves: the
+# board's settings and its players, serialized once and in leaderboard
+# order. Reads check the board's version (generation and revision), one
+# primary key lookup, and are answered from the snapshot; when the version
+# has moved on, a new snapshot is loaded and swapped in whole. Everything
+# that changes a board's players or ratings bumps its revision in the same
+# transaction.
+
+
+class Snapshot:
+    def __init__(self, board, players):
+        self.board = board
+        self.version = board.version
+        self.board_data = BoardSerializer(board).data
+
+        rows = PlayerSerializer(players, many=True).data
+        self.by_username = {row['username']: row for row in rows}
+        self.disabled = frozenset(player.username for player in players if player.disabled)
+
+        # Enabled players in leaderboard order, with their ratings as arrays
+        # for quality calculations
+        self.players = tuple(row for row in rows if row['username'] not in self.disabled)
+        self.mu = np.array([row['mu'] for row in self.players], dtype=float)
+        self.sigma = np.array([row['sigma'] for row in self.players], dtype=float)
+        self.mu.flags.writeable = self.sigma.flags.writeable = False
+
+        established = [row for row in self.players if not row['is_provisional']]
+        self._overall = {row['username']: index for index, row in enumerate(self.players)}
+        self._established = {row['username']: index for index, row in enumerate(established)}
+
+    @classmethod
+    def load(cls, board_name):
+        # The board (and so the revision) is read first. If a write commits
+        # before the players are read, the snapshot is newer than its
+        # revision and is just loaded again on the next request.
+        board = Board.objects.with_ratings_status().get(pk=board_name)
+        players = list(
+            Player.objects
+            .filter(board=board)
+            .order_by('-skill', 'username')
+        )
+        return cls(board, players)
+
+    # Like Player.standing
+    def standing(self, username):
+        if username in self.disabled:
+            return {'overall': None, 'established': None}
+
+        established = self._established.get(username)
+        return {
+            'overall': leaderboard_place(self._overall[username], len(self._overall)),
+            'established': None if established is None else leaderboard_place(established, len(self._established)),
+        }
+
+
+_snapshots = {}
+_load_locks = {}
+_load_locks_lock = threading.Lock()
+
+
+def _load_lock(board_name):
+    with _load_locks_lock:
+        return _load_locks.setdefault(board_name, threading.Lock())
+
+
+# The current snapshot of the board. Raises Board.DoesNotExist, like
+# objects.get. The snapshot is shared, so nothing in it may be modified.
+def get_snapshot(board_name):
+    version = Board.current_version(board_name)
+    snapshot = _snapshots.get(board_name)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    # Only one request per process loads a board's snapshot at a time; the
+    # others wait for it rather than all loading the same board
+    with _load_lock(board_name):
+        snapshot = _snapshots.get(board_name)
+        if snapshot is None or snapshot.version != version:
+            snapshot = _snapshots[board_name] = Snapshot.load(board_name)
+    return snapshot
+
+
+@receiver(post_delete, sender=Board)
+def drop_snapshot(instance, **kwargs):
+    _snapshots.pop(instance.name, None)
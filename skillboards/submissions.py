@@ -0,0 +1,155 @@
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db import transaction
+
+from skillboards.models import lock_board
+
+# Writes to a board (new games and players) go through a per-board queue in
+# each process. One waiting request at a time is the queue's leader: it takes
+# a batch of pending writes, starting with its own, and runs them in one
+# transaction holding the board's row lock, each in its own savepoint so that
+# one failing write doesn't undo the others. It then hands leadership to the
+# first write still waiting and returns, so no request ends up writing other
+# requests' submissions for longer than one batch. A burst of submissions
+# then costs a few commits rather than one each, and queued writes in one
+# process don't contend with each other for the database (which, on SQLite,
+# can fail with "database is locked" rather than wait).
+#
+# Only new games and players are queued. Game imports and rating recomputes
+# take the board's row lock directly and admin edits write without it, so
+# they can still contend with queued writes, as can other processes.
+#
+# Callers must not be inside a transaction of their own, since the leader may
+# be another request: on SQLite, a waiting request's open read transaction
+# would stop the leader from committing.
+
+
+class SubmissionFailed(Exception):
+    pass
+
+
+class _Write:
+    def __init__(self, run):
+        self.run = run
+        # Set when the write is done, or when it's made the leader
+        self.wake = threading.Event()
+        self.lead = False
+        self.done = False
+        self.result = None
+        self.error = None
+
+
+class _BoardQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = []
+        self.leading = False
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def _queue(board_name):
+    with _queues_lock:
+        return _queues.setdefault(board_name, _BoardQueue())
+
+
+def _run_batch(board_name, batch):
+    try:
+        with transaction.atomic():
+            board = lock_board(board_name)
+            for write in batch:
+                try:
+                    with transaction.atomic():
+                        write.result = write.run(board)
+                except Exception as e:
+                    write.error = e
+    except Exception as e:
+        # The commit itself failed, so none of the writes happened
+        for write in batch:
+            write.result, write.error = None, e
+    except BaseException:
+        # The leader was interrupted (a gevent Timeout, worker shutdown) and
+        # the transaction rolled back
+        for write in batch:
+            write.result, write.error = None, SubmissionFailed("The write was interrupted")
+        raise
+    finally:
+        for write in batch:
+            write.done = True
+            write.wake.set()
+
+
+# Called with the queue's lock held
+def _hand_off(queue):
+    if queue.pending:
+        successor = queue.pending[0]
+        successor.lead = True
+        successor.wake.set()
+    else:
+        queue.leading = False
+
+
+def _lead(board_name, queue):
+    try:
+        with queue.lock:
+            batch = queue.pending[:settings.SUBMISSION_BATCH_SIZE]
+            del queue.pending[:settings.SUBMISSION_BATCH_SIZE]
+        _run_batch(board_name, batch)
+    finally:
+        with queue.lock:
+            _hand_off(queue)
+
+
+def _wait(queue, write):
+    try:
+        woken = write.wake.wait(settings.SUBMISSION_TIMEOUT)
+    except BaseException:
+        # Don't leave the queue without a leader
+        with queue.lock:
+            if write in queue.pending:
+                queue.pending.remove(write)
+                if write.lead:
+                    _hand_off(queue)
+        raise
+
+    if woken:
+        return
+
+    with queue.lock:
+        if write.lead or write.done:
+            return
+        if write in queue.pending:
+            queue.pending.remove(write)
+            raise SubmissionFailed("Timed out waiting for other writes to the board")
+    raise SubmissionFailed("Timed out waiting for the write, which may still be saved")
+
+
+# Runs `run(board)` in a transaction holding the board's row lock, batched
+# with other writes to the same board, and returns its result or raises its
+# exception. `board` is a fresh Board instance. Raises SubmissionFailed if
+# the write doesn't happen within SUBMISSION_TIMEOUT seconds.
+def submit(board_name, run):
+    queue = _queue(board_name)
+    write = _Write(run)
+
+    with queue.lock:
+        queue.pending.append(write)
+        if not queue.leading:
+            queue.leading = write.lead = True
+
+    if not write.lead:
+        # Don't hold a pooled connection while waiting, since the leader may
+        # need it; closing returns it to the pool
+        if 'POOL' in connection.settings_dict:
+            connection.close()
+        _wait(queue, write)
+    if not write.done:
+        _lead(board_name, queue)
+
+    if write.error is not None:
+        raise write.error
+    return write.result
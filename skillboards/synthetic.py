@@ -0,0 +1,81 @@
+import random
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from skillboards.importer import import_games
+from skillboards.models import Board
+from skillboards.models import Player
+from skillboards.models import update_all_rankings
+from skillboards.models import update_player_skills
+
+# Synthetic boards for benchmarks. Players have a hidden true skill, and each
+# game's ranks follow the teams' total true skill plus noise, so ratings
+# behave much like on a real board.
+
+
+class Generator:
+    def __init__(self, *, players=100, team_sizes=(1, 2), teams=2, weights=False, backdate=0.0, seed=0):
+        self.player_count = players
+        self.team_sizes = team_sizes
+        self.teams = teams
+        self.weights = weights
+        self.backdate = backdate
+        self.random = random.Random(seed)
+        self.usernames = [f'player{index}' for index in range(players)]
+        self.true_skill = {username: self.random.gauss(25, 8) for username in self.usernames}
+
+    def teams_for_game(self):
+        size = self.random.choice(self.team_sizes)
+        chosen = self.random.sample(self.usernames, size * self.teams)
+        teams = [chosen[index::self.teams] for index in range(self.teams)]
+
+        performance = [
+            sum(self.true_skill[username] for username in team) + self.random.gauss(0, 4 * size)
+            for team in teams
+        ]
+        order = sorted(range(self.teams), key=lambda index: -performance[index])
+        ranks = {team: rank for rank, team in enumerate(order)}
+
+        return [
+            {
+                'rank': ranks[index],
+                'players': [
+                    {'username': username, 'weight': self.weight()}
+                    for username in team
+                ],
+            }
+            for index, team in enumerate(teams)
+        ]
+
+    def weight(self):
+        if self.weights and self.random.random() < 0.2:
+            return round(self.random.uniform(0.25, 1), 2)
+        return 1
+
+    # Game data as accepted by full_game, spaced `interval` apart up to
+    # `end`. A `backdate` fraction of them are moved back to a random earlier
+    # time, as if submitted late.
+    def games(self, count, *, end=None, interval=timedelta(minutes=10)):
+        if end is None:
+            end = timezone.now()
+        start = end - interval * count
+
+        for index in range(count):
+            time = start + interval * index
+            if index and self.random.random() < self.backdate:
+                time = start + (time - start) * self.random.random()
+            yield {'teams': self.teams_for_game(), 'time': time.isoformat()}
+
+    def create_board(self, name, games, **kwargs):
+        board = Board.objects.create(name=name)
+        Player.objects.bulk_create(
+            Player.create(username=username, print_name=username.title(), board=board)
+            for username in self.usernames
+        )
+        update_player_skills(board)
+
+        import_games(board, enumerate(self.games(games, **kwargs), 1))
+        update_all_rankings(board)
+        return board
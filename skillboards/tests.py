@@ -1,3 +1,1284 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from datetime import datetime
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import trueskill
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import connections
+from django.test import SimpleTestCase
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from skillboards import calculations as calc
+from skillboards import gaussian
+from skillboards import models
+from skillboards.balance import balance
+from skillboards.models import Board
+from skillboards.models import BoardLock
+from skillboards.models import Game
+from skillboards.models import GameTeamPlayer
+from skillboards.models import Player
+from skillboards.models import RatingRecompute
+from skillboards.models import RequestProfile
+from skillboards.models import process_recomputes
+from skillboards.models import request_recompute
+from skillboards.models import update_all_rankings
+from skillboards.snapshot import _snapshots
+from skillboards.snapshot import get_snapshot
+from skillboards.submissions import SubmissionFailed
+from skillboards.submissions import _queue
+from skillboards.submissions import submit
+from skillboards.synthetic import Generator
+from skillboards.views import leaderboard_cache
+from skillserve.db.pool import Pool
+from skillserve.db.pool import PoolTimeout
+from skillserve.db.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+
+START = datetime(2017, 6, 1, tzinfo=timezone.utc)
+
+
+@override_settings(RATING_RECOMPUTE_MODE='inline')
+class BoardTestCase(TestCase):
+    usernames = ['alice', 'bob', 'carol', 'dave']
+
+    def setUp(self):
+        self.board = Board.objects.create(name='test')
+        self.players = {}
+        for username in self.usernames:
+            player = Player.create(username=username, print_name=username.title(), board=self.board)
+            player.save()
+            self.players[username] = player
+
+    def play(self, *teams, minutes=None):
+        time = None if minutes is None else START + timedelta(minutes=minutes)
+        Game.create_game(
+            board=self.board,
+            teams=[
+                (rank, [(self.players[username], 1) for username in team])
+                for rank, team in enumerate(teams)
+            ],
+            time=time,
+        )
+
+    def ratings(self):
+        return {
+            player.username: (player.mu, player.sigma, player.games, player.wins, player.losses)
+            for player in Player.objects.filter(board=self.board)
+        }
+
+    def assertRatingsEqual(self, first, second):
+        self.assertEqual(first.keys(), second.keys())
+        for username, values in first.items():
+            for a, b in zip(values, second[username]):
+                self.assertAlmostEqual(a, b, places=9, msg=username)
+
+
+@override_settings(RATING_CHECKPOINT_INTERVAL=3)
+class CheckpointTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        matchups = [
+            (['alice'], ['bob']),
+            (['carol', 'dave'], ['alice', 'bob']),
+            (['bob'], ['carol']),
+            (['alice', 'dave'], ['bob', 'carol']),
+            (['dave'], ['alice']),
+            (['carol'], ['bob']),
+            (['alice', 'carol'], ['bob', 'dave']),
+        ]
+        for minutes, teams in enumerate(matchups):
+            self.play(*teams, minutes=minutes * 10)
+
+    def test_checkpoints_created(self):
+        self.assertEqual(
+            list(self.board.checkpoints.order_by('game_count').values_list('game_count', flat=True)),
+            [3, 6]
+        )
+
+    def test_backdated_game_matches_full_replay(self):
+        self.play(['bob'], ['dave'], minutes=45)
+        incremental = self.ratings()
+
+        update_all_rankings(self.board)
+        self.assertRatingsEqual(incremental, self.ratings())
+        self.assertEqual(self.ratings()['dave'][2], 5)
+
+    def test_future_game_rejected(self):
+        future = timezone.now() + timedelta(days=1)
+        with self.assertRaises(ValidationError):
+            Game.create_game(
+                board=self.board,
+                teams=[(0, [(self.players['alice'], 1)]), (1, [(self.players['bob'], 1)])],
+                time=future,
+            )
+
+        teams = [{'rank': 0, 'players': ['alice']}, {'rank': 1, 'players': ['bob']}]
+        for path, data in [
+            ('full_game', {'teams': teams, 'time': future.isoformat()}),
+            ('full_games', [{'teams': teams, 'time': future.isoformat()}]),
+        ]:
+            response = self.client.post(
+                f'/api/boards/test/{path}', json.dumps(data), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Game.objects.filter(board=self.board).count(), 7)
+
+        # A later backdated game is still counted once
+        self.play(['bob'], ['dave'], minutes=45)
+        incremental = self.ratings()
+        update_all_rankings(self.board)
+        self.assertRatingsEqual(incremental, self.ratings())
+
+    def test_delete_matches_full_replay(self):
+        Game.objects.filter(board=self.board).order_by('time')[4].delete()
+        incremental = self.ratings()
+
+        update_all_rankings(self.board)
+        self.assertRatingsEqual(incremental, self.ratings())
+        self.assertEqual(
+            list(self.board.checkpoints.values_list('game_count', flat=True)),
+            [3, 6]
+        )
+
+
+class RatingDeltaTests(BoardTestCase):
+    def test_deltas_chain_between_games(self):
+        self.play(['alice'], ['bob'], minutes=0)
+        self.play(['bob'], ['alice'], minutes=10)
+
+        first, second = (
+            GameTeamPlayer.objects
+            .filter(player=self.players['alice'])
+            .order_by('team__game__time')
+        )
+        self.assertEqual(first.mu_before, self.board.mu)
+        self.assertGreater(first.mu_after, first.mu_before)
+        self.assertEqual(second.rating_before, first.rating_after)
+        self.assertLess(second.mu_after, second.mu_before)
+
+    def test_recent_game_includes_deltas(self):
+        self.play(['alice', 'bob'], ['carol', 'dave'])
+
+        response = self.client.get('/api/boards/test/players/carol/recent_game')
+        self.assertEqual(response.status_code, 200)
+
+        losers = response.json()['teams'][1]['players']
+        self.assertEqual({player['username'] for player in losers}, {'carol', 'dave'})
+        for player in losers:
+            self.assertLess(player['mu_after'], player['mu_before'])
+
+
+class HistoryTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        for minutes in range(20):
+            self.play(['alice'], ['bob'] if minutes % 3 else ['carol'], minutes=minutes)
+
+    def history(self, **params):
+        response = self.client.get('/api/boards/test/players/alice/history', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_history_matches_deltas(self):
+        history = self.history()
+        self.assertEqual(history['total'], 20)
+
+        deltas = GameTeamPlayer.objects.filter(player=self.players['alice']).order_by('team__game__time')
+        for point, delta in zip(history['points'], deltas):
+            self.assertEqual(point['mu'], delta.mu_after)
+            self.assertEqual(point['sigma'], delta.sigma_after)
+
+    def test_history_range_and_downsampling(self):
+        history = self.history(
+            start=(START + timedelta(minutes=5)).isoformat(),
+            end=(START + timedelta(minutes=15)).isoformat(),
+            points=4
+        )
+        self.assertEqual(history['total'], 10)
+        self.assertEqual(len(history['points']), 4)
+
+    def test_history_rewritten_by_replay(self):
+        before = self.history()['points']
+        Game.objects.order_by('time').first().delete()
+
+        after = self.history()['points']
+        self.assertEqual(len(after), 19)
+        self.assertNotEqual(before[1:], after)
+
+        update_all_rankings(self.board)
+        self.assertEqual(self.history()['points'], after)
+
+    def test_board_changed_elsewhere(self):
+        # This process's cached Board is stale after another process's change
+        Board.get_cached('test')
+        Board.objects.filter(pk='test').update(mu=30)
+
+        point = self.history()['points'][-1]
+        self.assertAlmostEqual(point['skill'], point['mu'] - point['sigma'] * 30 / self.board.sigma)
+
+
+class ReplayTests(BoardTestCase):
+    matchups = [
+        (['alice'], ['bob']),
+        (['carol', 'dave'], ['alice', 'bob']),
+        (['bob'], ['carol']),
+        (['alice', 'dave'], ['bob', 'carol']),
+    ]
+
+    def deltas(self):
+        return {
+            gplayer.pk: (gplayer.mu_before, gplayer.sigma_before, gplayer.mu_after, gplayer.sigma_after)
+            for gplayer in GameTeamPlayer.objects.all()
+        }
+
+    def replay_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            update_all_rankings(self.board)
+        return len(queries)
+
+    def test_replay_matches_live_ratings(self):
+        for teams in self.matchups * 3:
+            self.play(*teams)
+        live_ratings, live_deltas = self.ratings(), self.deltas()
+
+        update_all_rankings(self.board)
+        self.assertRatingsEqual(live_ratings, self.ratings())
+        self.assertRatingsEqual(live_deltas, self.deltas())
+
+    def test_replay_query_count_is_constant(self):
+        for teams in self.matchups:
+            self.play(*teams)
+        queries = self.replay_queries()
+
+        for teams in self.matchups * 5:
+            self.play(*teams)
+        self.assertEqual(self.replay_queries(), queries)
+
+
+class ReplayRatingsCommandTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.play(['alice'], ['bob'])
+        self.play(['carol'], ['dave'])
+        # Ratings that a replay would change
+        Player.objects.filter(username='alice').update(mu=40)
+
+    def replay(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('replay_ratings', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_dry_run(self):
+        ratings = self.ratings()
+        stdout, _ = self.replay('--dry-run')
+        self.assertIn('Checked 1 board(s)', stdout)
+        self.assertEqual(self.ratings(), ratings)
+
+        self.replay()
+        self.assertNotEqual(self.ratings()['alice'], ratings['alice'])
+
+    def test_unknown_board(self):
+        with self.assertRaisesMessage(CommandError, 'No such board(s): nope'):
+            self.replay('--board', 'test', '--board', 'nope')
+
+    def test_jobs_on_sqlite(self):
+        Board.objects.create(name='other')
+        with mock.patch('multiprocessing.Pool') as pool:
+            stdout, stderr = self.replay('--jobs', '2')
+        pool.assert_not_called()
+        self.assertIn('one by one', stderr)
+        self.assertIn('Replayed 2 board(s)', stdout)
+        self.assertNotEqual(Player.objects.get(username='alice').mu, 40)
+
+
+class VectorizedRankingTests(SimpleTestCase):
+    def setUp(self):
+        self.env = Board(name='test').trueskill_environ()
+        self.random = random.Random(1)
+        self.player_count = 0
+
+    def team(self, rank, size, weights=(1,)):
+        players = {}
+        for _ in range(size):
+            self.player_count += 1
+            players[f'p{self.player_count}'] = calc.Player(
+                rating=trueskill.Rating(
+                    mu=self.random.uniform(0, 50),
+                    sigma=self.random.uniform(0.5, 9)
+                ),
+                weight=self.random.choice(weights),
+                instance=self.player_count,
+            )
+        return calc.Team(rank=rank, players=players)
+
+    def assertResultsEqual(self, expected, actual):
+        self.assertEqual(expected.keys(), actual.keys())
+        for name, result in expected.items():
+            self.assertEqual(result.instance, actual[name].instance)
+            self.assertEqual(result.winner, actual[name].winner)
+            self.assertAlmostEqual(result.rating.mu, actual[name].rating.mu, places=9)
+            self.assertAlmostEqual(result.rating.sigma, actual[name].rating.sigma, places=9)
+
+    def assertEquivalent(self, teams):
+        self.assertResultsEqual(
+            calc.calculate_updated_rankings(teams, self.env),
+            calc.calculate_updated_rankings_vectorized(teams, self.env)
+        )
+
+    def test_1v1(self):
+        for _ in range(50):
+            self.assertEquivalent([self.team(0, 1), self.team(1, 1)])
+
+    def test_2v2(self):
+        for _ in range(50):
+            self.assertEquivalent([self.team(1, 2), self.team(0, 2)])
+
+    def test_uneven_teams(self):
+        for _ in range(50):
+            self.assertEquivalent([self.team(0, 1), self.team(1, 3)])
+
+    def test_draws(self):
+        for _ in range(50):
+            self.assertEquivalent([self.team(0, 2), self.team(0, 2)])
+
+    def test_weights(self):
+        for _ in range(50):
+            self.assertEquivalent([
+                self.team(0, 2, weights=(0, 0.25, 0.5, 1)),
+                self.team(1, 2, weights=(0, 0.25, 0.5, 1)),
+            ])
+
+    def test_more_teams_fall_back(self):
+        self.assertEquivalent([self.team(0, 1), self.team(2, 2), self.team(1, 1)])
+
+    def test_batch_matches_individual_games(self):
+        games = [
+            [self.team(0, self.random.randint(1, 2)), self.team(1, self.random.randint(1, 2))]
+            for _ in range(20)
+        ] + [[self.team(0, 1), self.team(1, 1), self.team(1, 1)]]
+        self.random.shuffle(games)
+
+        for teams, actual in zip(games, calc.calculate_updated_rankings_batch(games, self.env)):
+            self.assertResultsEqual(calc.calculate_updated_rankings(teams, self.env), actual)
+
+    def test_impossible_upset_raises(self):
+        teams = [
+            calc.Team(rank=0, players={'a': calc.Player(rating=trueskill.Rating(-500, 0.01), instance=1)}),
+            calc.Team(rank=1, players={'b': calc.Player(rating=trueskill.Rating(500, 0.01), instance=2)}),
+        ]
+        with self.assertRaises(FloatingPointError):
+            calc.calculate_updated_rankings(teams, self.env)
+        with self.assertRaises(FloatingPointError):
+            calc.calculate_updated_rankings_vectorized(teams, self.env)
+
+
+class TableBackendTests(SimpleTestCase):
+    def test_matches_scipy(self):
+        scipy_env = gaussian.environ(backend='scipy')
+        table_env = gaussian.environ(backend='table')
+        rng = random.Random(2)
+
+        for _ in range(100):
+            teams = [
+                tuple(trueskill.Rating(rng.uniform(0, 50), rng.uniform(0.5, 9)) for _ in range(size))
+                for size in (rng.randint(1, 2), rng.randint(1, 2), rng.randint(1, 2))
+            ]
+            ranks = [rng.randint(0, 2) for _ in teams]
+
+            try:
+                expected = scipy_env.rate(teams, ranks)
+            except FloatingPointError:
+                continue
+
+            for expected_team, actual_team in zip(expected, table_env.rate(teams, ranks)):
+                for expected_rating, actual_rating in zip(expected_team, actual_team):
+                    self.assertAlmostEqual(expected_rating.mu, actual_rating.mu, places=8)
+                    self.assertAlmostEqual(expected_rating.sigma, actual_rating.sigma, places=8)
+
+    def test_ppf_inverts_cdf(self):
+        for p in (1e-6, 0.01, 0.3, 0.5, 0.55, 0.9, 0.999):
+            self.assertAlmostEqual(gaussian.cdf(gaussian.ppf(p)), p, places=12)
+
+
+class BoardCacheTests(TestCase):
+    def test_cached_until_saved(self):
+        board = Board.objects.create(name='cached')
+        self.assertEqual(Board.get_cached('cached').mu, board.mu)
+
+        with self.assertNumQueries(0):
+            Board.get_cached('cached').trueskill_environ()
+
+        board.mu = 30
+        board.save()
+        self.assertEqual(Board.get_cached('cached').mu, 30)
+
+    def test_shared_environments(self):
+        first = Board.objects.create(name='first')
+        second = Board.objects.create(name='second')
+        self.assertIs(first.trueskill_environ(), second.trueskill_environ())
+
+        second.tau = 1
+        self.assertIsNot(first.trueskill_environ(), second.trueskill_environ())
+
+    def test_missing_board(self):
+        with self.assertRaises(Board.DoesNotExist):
+            Board.get_cached('missing')
+        self.assertEqual(self.client.get('/api/boards/missing/players/').status_code, 404)
+
+
+@override_settings(RATING_RECOMPUTE_MODE='command')
+class RecomputeQueueTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        for minutes in range(6):
+            self.play(['alice', 'bob'], ['carol', 'dave'], minutes=minutes)
+        process_recomputes()
+
+    def status(self):
+        return self.client.get('/api/boards/test/').json()['ratings_status']
+
+    def test_deletions_are_merged(self):
+        self.assertEqual(self.status(), 'current')
+
+        Game.objects.filter(time__gte=START + timedelta(minutes=3)).delete()
+        self.assertEqual(RatingRecompute.objects.get().version, 2)
+        self.assertEqual(self.status(), 'stale')
+
+        process_recomputes()
+        self.assertFalse(RatingRecompute.objects.exists())
+        self.assertEqual(self.status(), 'current')
+        self.assertEqual(self.ratings()['alice'][2], 3)
+
+    def test_live_games_wait_for_pending_replay(self):
+        self.play(['carol'], ['alice'], minutes=-10)
+        self.play(['alice'], ['bob'])
+        self.assertEqual(self.ratings()['bob'][2], 6)
+
+        process_recomputes()
+        self.assertEqual(self.ratings()['alice'][2], 8)
+        self.assertEqual(self.ratings()['bob'][2], 7)
+
+    def test_board_list_status(self):
+        Board.objects.create(name='other')
+        Game.objects.filter(time__gte=START + timedelta(minutes=3)).delete()
+        self.client.get('/api/boards')
+
+        with self.assertNumQueries(1):
+            boards = {board['name']: board for board in self.client.get('/api/boards').json()}
+        self.assertEqual(boards['test']['ratings_status'], 'stale')
+        self.assertEqual(boards['other']['ratings_status'], 'current')
+
+        RatingRecompute.objects.update(started=timezone.now())
+        boards = {board['name']: board for board in self.client.get('/api/boards').json()}
+        self.assertEqual(boards['test']['ratings_status'], 'recomputing')
+
+
+class RecomputeWorkerTests(SimpleTestCase):
+    def test_job_queued_while_worker_exits(self):
+        # The worker has found nothing to do, but hasn't exited yet
+        models._recompute_wanted = False
+        models._recompute_worker = threading.current_thread()
+
+        models._start_recompute_worker()
+        self.assertTrue(models._recompute_wanted)
+
+        # It sees the new request and runs again instead of exiting
+        with mock.patch.object(models, 'connection'):
+            with mock.patch.object(models, 'process_recomputes') as process:
+                models._recompute_worker_main()
+        process.assert_called_once_with()
+        self.assertIsNone(models._recompute_worker)
+        self.assertFalse(models._recompute_wanted)
+
+
+class LeaderboardCacheTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        leaderboard_cache.clear()
+
+    def leaderboard(self, **params):
+        response = self.client.get('/api/boards/test/players/', params)
+        self.assertEqual(response.status_code, 200)
+        return {player['username']: player for player in response.json()}
+
+    def test_cached_until_game_submitted(self):
+        self.leaderboard()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.leaderboard()['alice']['games'], 0)
+
+        self.play(['alice'], ['bob'])
+        self.assertEqual(self.leaderboard()['alice']['games'], 1)
+
+    def test_cached_until_player_registered(self):
+        self.leaderboard()
+        self.client.post('/api/boards/test/register', {'username': 'erin', 'print_name': 'Erin'})
+        self.assertIn('erin', self.leaderboard())
+
+    def test_cached_per_viewer(self):
+        self.play(['alice'], ['bob'])
+        self.assertNotEqual(
+            self.leaderboard(**{'as': 'alice'})['alice']['quality'],
+            self.leaderboard(**{'as': 'bob'})['alice']['quality'],
+        )
+
+
+class QualityMatrixTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.play(['alice', 'bob'], ['carol', 'dave'])
+        self.play(['alice'], ['carol'])
+
+    def test_matrix_matches_quality_1vs1(self):
+        data = self.client.get('/api/boards/test/quality').json()
+        env = self.board.trueskill_environ()
+        players = {player.username: player for player in Player.objects.all()}
+
+        for username, row in zip(data['players'], data['quality']):
+            for other, quality in zip(data['players'], row):
+                self.assertAlmostEqual(
+                    quality,
+                    env.quality_1vs1(players[username].rating, players[other].rating),
+                    places=12
+                )
+
+    def test_top_partners(self):
+        top = self.client.get('/api/boards/test/quality', {'top': 2}).json()['top']
+        full = self.client.get('/api/boards/test/quality').json()
+        index = full['players'].index('alice')
+        expected = sorted(
+            (
+                (quality, username)
+                for username, quality in zip(full['players'], full['quality'][index])
+                if username != 'alice'
+            ),
+            reverse=True
+        )[:2]
+
+        self.assertEqual([partner['username'] for partner in top['alice']], [name for _, name in expected])
+
+    def test_board_changed_elsewhere(self):
+        # Another process changes the board's settings: this process's cached
+        # Board is stale, but the revision has moved on
+        Board.get_cached('test')
+        Board.objects.filter(pk='test').update(beta=20)
+        Board.bump_revision('test')
+
+        data = self.client.get('/api/boards/test/quality').json()
+        env = Board.objects.get(pk='test').trueskill_environ()
+        players = {player.username: player for player in Player.objects.all()}
+        self.assertAlmostEqual(
+            data['quality'][0][1],
+            env.quality_1vs1(players[data['players'][0]].rating, players[data['players'][1]].rating),
+            places=12
+        )
+
+    def test_unknown_viewer(self):
+        response = self.client.get('/api/boards/test/players/', {'as': 'nobody'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('quality', response.json()[0])
+
+
+class BalanceTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.play(['alice'], ['bob'])
+        self.play(['alice', 'carol'], ['bob', 'dave'])
+
+    def test_best_split(self):
+        response = self.client.post('/api/boards/test/balance', json.dumps({
+            'players': ['alice', 'bob', 'carol', 'dave'],
+            'team_size': 2,
+            'top': 3,
+        }), content_type='application/json')
+        data = response.json()
+
+        env = self.board.trueskill_environ()
+        ratings = {player.username: player.rating for player in Player.objects.all()}
+        splits = [
+            [['alice', 'bob'], ['carol', 'dave']],
+            [['alice', 'carol'], ['bob', 'dave']],
+            [['alice', 'dave'], ['bob', 'carol']],
+        ]
+        expected = sorted(
+            env.quality([[ratings[name] for name in team] for team in split])
+            for split in splits
+        )[::-1]
+
+        self.assertTrue(data['exact'])
+        for split, quality in zip(data['splits'], expected):
+            self.assertAlmostEqual(split['quality'], quality, places=12)
+            self.assertAlmostEqual(
+                split['quality'],
+                env.quality([[ratings[name] for name in team] for team in split['teams']]),
+                places=12
+            )
+
+    def test_unknown_player(self):
+        response = self.client.post('/api/boards/test/balance', json.dumps({
+            'players': ['alice', 'nobody'],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_many_players(self):
+        response = self.client.post('/api/boards/test/balance', json.dumps({
+            'players': [f'player{index}' for index in range(25)],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('players', response.json())
+
+    def test_local_search_keeps_to_budget(self):
+        rng = random.Random(3)
+        ratings = [trueskill.Rating(mu=rng.gauss(25, 5), sigma=rng.uniform(1, 8)) for _ in range(24)]
+
+        start = time.monotonic()
+        exact, splits = balance(ratings, 12, trueskill.BETA, time_budget=0.05)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        self.assertFalse(exact)
+        self.assertEqual(len(splits), 5)
+
+
+class ImportTests(BoardTestCase):
+    def games(self):
+        return [
+            {
+                'teams': [
+                    {'rank': 0, 'players': ['alice', 'bob']},
+                    {'rank': 1, 'players': ['carol', 'dave']},
+                ],
+                'time': (START + timedelta(minutes=2)).isoformat(),
+            },
+            {
+                'teams': [
+                    {'rank': 0, 'players': ['carol']},
+                    {'rank': 1, 'players': [{'username': 'alice', 'weight': 0.5}]},
+                ],
+                'time': (START + timedelta(minutes=1)).isoformat(),
+            },
+        ]
+
+    def test_matches_single_games(self):
+        self.play(['alice'], ['dave'], minutes=0)
+        response = self.client.post(
+            '/api/boards/test/full_games',
+            '\n'.join(json.dumps(game) for game in self.games()),
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'games': 2})
+        imported = self.ratings()
+
+        Game.objects.exclude(time=START).delete()
+        for game in self.games():
+            self.client.post('/api/boards/test/full_game', json.dumps(game), content_type='application/json')
+
+        self.assertEqual(Game.objects.filter(time__gt=START).count(), 2)
+        self.assertRatingsEqual(imported, self.ratings())
+
+    def test_invalid_game_imports_nothing(self):
+        games = self.games()
+        games[1]['teams'][1]['players'] = ['nobody']
+        response = self.client.post(
+            '/api/boards/test/full_games', json.dumps(games), content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['2'])
+        self.assertFalse(Game.objects.exists())
+
+
+class ExportTests(BoardTestCase):
+    def test_round_trip(self):
+        self.play(['alice', 'bob'], ['carol', 'dave'], minutes=1)
+        self.play(['carol'], ['alice'], minutes=2)
+        ratings = self.ratings()
+
+        response = self.client.get('/api/boards/test/export.ndjson')
+        exported = b''.join(response.streaming_content)
+        games = [json.loads(line) for line in exported.decode().splitlines()]
+        self.assertEqual(games[1]['teams'][0]['players'][0]['username'], 'carol')
+        self.assertIsNotNone(games[1]['teams'][0]['players'][0]['mu_after'])
+
+        Game.objects.all().delete()
+        response = self.client.post(
+            '/api/boards/test/full_games', exported, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertRatingsEqual(ratings, self.ratings())
+
+    def test_csv(self):
+        self.play(['alice'], ['bob'])
+        response = self.client.get('/api/boards/test/export.csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(lines[0].split(','), [
+            'game', 'time', 'team', 'rank', 'username', 'weight',
+            'mu_before', 'sigma_before', 'mu_after', 'sigma_after',
+        ])
+        self.assertEqual([line.split(',')[4] for line in lines[1:]], ['alice', 'bob'])
+
+    def test_csv_round_trip_with_draw(self):
+        self.play(['alice', 'bob'], ['carol', 'dave'], minutes=1)
+        Game.create_game(
+            board=self.board,
+            teams=[
+                (0, [(self.players['alice'], 1)]),
+                (0, [(self.players['bob'], 1)]),
+                (1, [(self.players['carol'], 1)]),
+            ],
+            time=START + timedelta(minutes=2),
+        )
+        ratings = self.ratings()
+
+        response = self.client.get('/api/boards/test/export.csv')
+        exported = b''.join(response.streaming_content)
+
+        Game.objects.all().delete()
+        response = self.client.post('/api/boards/test/full_games', exported, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'games': 2})
+
+        draw = Game.objects.get(time=START + timedelta(minutes=2))
+        self.assertEqual(sorted(team.rank for team in draw.teams.all()), [0, 0, 1])
+        self.assertRatingsEqual(ratings, self.ratings())
+
+
+class GameListTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        for minute in range(5):
+            self.play(['alice', 'bob'], ['carol'], minutes=minute)
+        self.play(['dave'], ['carol'], minutes=4)
+
+    def fetch(self, url, limit):
+        ids = []
+        cursor = None
+        while True:
+            params = {'limit': limit}
+            if cursor is not None:
+                params['cursor'] = cursor
+            data = self.client.get(url, params).json()
+            ids.extend(game['id'] for game in data['games'])
+            cursor = data['next']
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_game(self):
+        expected = list(Game.objects.order_by('-time', '-pk').values_list('pk', flat=True))
+        for limit in (1, 2, 6, 50):
+            self.assertEqual(self.fetch('/api/boards/test/games', limit), expected)
+
+        self.assertEqual(len(self.fetch('/api/boards/test/players/dave/games', 2)), 1)
+        self.assertEqual(len(self.fetch('/api/boards/test/players/carol/games', 2)), 6)
+
+    def test_constant_queries(self):
+        self.client.get('/api/boards/test/games')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/boards/test/games', {'limit': 1})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get('/api/boards/test/games', {'limit': 50})
+        self.assertEqual(len(small), len(large))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/boards/test/games', {'cursor': 'nonsense'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BoardLockTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.lock = BoardLock.objects.create(
+            board=self.board,
+            start=now - timedelta(hours=1),
+            end=now + timedelta(hours=1)
+        )
+        BoardLock.objects.create(board=self.board, start=START, end=START + timedelta(days=1))
+
+    def post_game(self, time=None):
+        return self.client.post('/api/boards/test/full_game', json.dumps({
+            'teams': [{'rank': 0, 'players': ['alice']}, {'rank': 1, 'players': ['bob']}],
+            'time': time and time.isoformat(),
+        }), content_type='application/json')
+
+    def test_locked_now(self):
+        response = self.post_game()
+        self.assertEqual(response.status_code, 423)
+        self.assertEqual(response.json()['unlock_time'], self.lock.end.isoformat().replace('+00:00', 'Z'))
+
+        response = self.client.post('/api/boards/test/register', {'username': 'erin', 'print_name': 'Erin'})
+        self.assertEqual(response.status_code, 423)
+        response = self.client.post('/api/boards/test/register', {'username': 'alice', 'print_name': 'Ally'})
+        self.assertEqual(response.status_code, 423)
+
+        # Existing players can still sign in
+        response = self.client.post('/api/boards/test/register', {'username': 'alice', 'print_name': 'Alice'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/boards/test/register', {'username': 'alice'})
+        self.assertEqual(response.status_code, 200)
+
+        self.lock.delete()
+        self.assertEqual(self.post_game().status_code, 204)
+
+    def test_backdated_into_lock(self):
+        self.lock.delete()
+        self.assertEqual(self.post_game(START + timedelta(hours=1)).status_code, 423)
+        self.assertEqual(self.post_game(START - timedelta(hours=1)).status_code, 204)
+        self.assertEqual(self.post_game(START + timedelta(days=1)).status_code, 204)
+
+    def test_import(self):
+        teams = [{'rank': 0, 'players': ['alice']}, {'rank': 1, 'players': ['bob']}]
+        games = [
+            {'teams': teams, 'time': (START + offset).isoformat()}
+            for offset in [timedelta(hours=-1), timedelta(hours=1)]
+        ]
+
+        def post_games():
+            return self.client.post(
+                '/api/boards/test/full_games', json.dumps(games), content_type='application/json'
+            )
+
+        response = post_games()
+        self.assertEqual(response.status_code, 423)
+        self.assertIn('unlock_time', response.json())
+
+        self.lock.delete()
+        response = post_games()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), ['2'])
+        self.assertEqual(Game.objects.count(), 0)
+
+        del games[1]
+        self.assertEqual(post_games().status_code, 201)
+        self.assertEqual(Game.objects.count(), 1)
+
+    def test_no_queries_when_cached(self):
+        board = Board.get_cached('test')
+        board.unlock_time()
+        with self.assertNumQueries(0):
+            self.assertEqual(board.unlock_time(), self.lock.end)
+            self.assertIsNone(board.unlock_time(START - timedelta(seconds=1)))
+
+
+class SkillColumnTests(BoardTestCase):
+    def assertSkillsCurrent(self):
+        board = Board.objects.get(pk='test')
+        for player in Player.objects.all():
+            skill, upper_skill, is_provisional = (
+                player.mu - player.sigma * board.mu / board.sigma,
+                player.mu + player.sigma * board.mu / board.sigma,
+                player.sigma > 7.5,
+            )
+            self.assertAlmostEqual(player.skill, skill, places=9)
+            self.assertAlmostEqual(player.upper_skill, upper_skill, places=9)
+            self.assertEqual(player.is_provisional, is_provisional)
+
+    def test_kept_current(self):
+        self.play(['alice'], ['bob'])
+        self.play(['carol', 'alice'], ['dave', 'bob'])
+        self.assertSkillsCurrent()
+
+        self.play(['dave'], ['alice'], minutes=0)
+        self.assertSkillsCurrent()
+
+        self.board.sigma = 5
+        self.board.save()
+        self.assertSkillsCurrent()
+
+    def test_top_and_pages(self):
+        self.play(['alice'], ['bob'])
+        self.play(['alice'], ['carol'])
+        self.play(['carol'], ['dave'])
+
+        expected = list(Player.objects.order_by('-skill', 'username').values_list('username', flat=True))
+
+        response = self.client.get('/api/boards/test/players/', {'top': 2})
+        self.assertEqual([player['username'] for player in response.json()], expected[:2])
+
+        response = self.client.get('/api/boards/test/players/', {'limit': 2, 'offset': 1})
+        self.assertEqual([player['username'] for player in response.json()], expected[1:3])
+
+        response = self.client.get('/api/boards/test/players/', {'limit': 1, 'offset': 3, 'as': 'alice'})
+        self.assertEqual(response.json()[0]['username'], expected[3])
+        self.assertIn('quality', response.json()[0])
+
+
+class StandingTests(BoardTestCase):
+    def test_matches_leaderboard(self):
+        for _ in range(3):
+            self.play(['alice'], ['bob'])
+
+        leaderboard = [player['username'] for player in self.client.get('/api/boards/test/players/').json()]
+        established = [
+            username for username in leaderboard
+            if not Player.objects.get(username=username).is_provisional
+        ]
+        self.assertEqual(established, ['alice', 'bob'])
+
+        for rank, username in enumerate(leaderboard, 1):
+            standing = self.client.get(f'/api/boards/test/players/{username}').json()['standing']
+            self.assertEqual(standing['overall']['rank'], rank)
+            self.assertEqual(standing['overall']['of'], 4)
+            self.assertAlmostEqual(standing['overall']['percentile'], 100 * (4 - rank) / 3)
+
+            if username in established:
+                self.assertEqual(standing['established']['rank'], established.index(username) + 1)
+            else:
+                self.assertIsNone(standing['established'])
+
+    def test_register(self):
+        response = self.client.post('/api/boards/test/register', {'username': 'erin', 'print_name': 'Erin'})
+        self.assertEqual(response.json()['standing']['overall']['of'], 5)
+
+
+class SnapshotTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        leaderboard_cache.clear()
+
+    def test_reads_served_from_memory(self):
+        self.play(['alice'], ['bob'])
+        self.client.get('/api/boards/test/')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/boards/test/players/alice').json()['games'], 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/boards/test/').json()['ratings_status'], 'current')
+
+    def test_swapped_after_write(self):
+        before = get_snapshot('test')
+        self.play(['alice'], ['bob'])
+        after = get_snapshot('test')
+
+        self.assertIsNot(before, after)
+        self.assertGreater(after.version[1], before.version[1])
+        self.assertEqual(before.by_username['alice']['games'], 0)
+        self.assertEqual(after.by_username['alice']['games'], 1)
+
+    def test_recreated_board(self):
+        stale = get_snapshot('test')
+
+        Board.objects.filter(pk='test').delete()
+        board = Board.objects.create(name='test')
+        Player.create(username='erin', print_name='Erin', board=board).save()
+        self.assertEqual(board.revision, stale.version[1])
+
+        # Another process that missed the deletion still has the old snapshot
+        _snapshots['test'] = stale
+        self.assertEqual(list(get_snapshot('test').by_username), ['erin'])
+
+    def test_ratings_status(self):
+        self.play(['alice'], ['bob'])
+        self.client.get('/api/boards/test/')
+
+        with override_settings(RATING_RECOMPUTE_MODE='command'):
+            request_recompute('test', START)
+        self.assertEqual(self.client.get('/api/boards/test/').json()['ratings_status'], 'stale')
+
+    def test_disabled_player(self):
+        self.client.get('/api/boards/test/players/')
+        alice = self.players['alice']
+        alice.disabled = True
+        alice.save()
+        Board.bump_revision('test')
+
+        usernames = [player['username'] for player in self.client.get('/api/boards/test/players/').json()]
+        self.assertEqual(usernames, ['bob', 'carol', 'dave'])
+        standing = self.client.get('/api/boards/test/players/alice').json()['standing']
+        self.assertEqual(standing, {'overall': None, 'established': None})
+
+
+class MetricsTests(BoardTestCase):
+    def test_exposes_requests_and_ratings(self):
+        self.client.get('/api/boards/test/players/')
+        self.play(['alice'], ['bob'])
+        update_all_rankings(self.board)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+
+        self.assertIn(
+            'skillserve_request_duration_seconds_bucket{view="skillboards.views.player_list",'
+            'method="GET",status="200",le="+Inf"}',
+            text
+        )
+        self.assertIn('skillserve_request_queries_count{view="skillboards.views.player_list"}', text)
+        self.assertIn('skillserve_rating_games_total{function="update_all_rankings"}', text)
+        self.assertIn(
+            'skillserve_rating_duration_seconds_count{function="calculate_updated_rankings"}', text
+        )
+
+
+class ProfilingTests(BoardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        self.staff = User.objects.create_user('staff', password='password', is_staff=True)
+
+    def profile(self, **extra):
+        with self.settings(PROFILING_ENABLED=True, PROFILE_DIR=self.profile_dir.name, PROFILE_KEEP=2):
+            return self.client.get('/api/boards/test/players/', {'profile': '1'}, **extra)
+
+    def test_staff_only(self):
+        self.assertNotIn('X-Profile-Id', self.profile())
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_saves_bounded_ring(self):
+        self.client.force_login(self.staff)
+        ids = [int(self.profile()['X-Profile-Id']) for _ in range(3)]
+
+        self.assertEqual(sorted(RequestProfile.objects.values_list('pk', flat=True)), ids[1:])
+        self.assertEqual(sorted(os.listdir(self.profile_dir.name)), [f'{pk}.prof' for pk in ids[1:]])
+
+        profile = RequestProfile.objects.get(pk=ids[-1])
+        self.assertIn('player_list', profile.stats)
+        self.assertIn('skillboards_board', profile.queries)
+
+
+class SyntheticBoardTests(TestCase):
+    def test_generated_board(self):
+        generator = Generator(players=12, team_sizes=(1, 3), weights=True, backdate=0.3, seed=1)
+        board = generator.create_board('synthetic', 40, end=START)
+
+        self.assertEqual(Player.objects.filter(board=board).count(), 12)
+        self.assertEqual(Game.objects.filter(board=board).count(), 40)
+        earliest = START - timedelta(minutes=10 * 40)
+        self.assertFalse(Game.objects.filter(board=board, time__lt=earliest).exists())
+        self.assertEqual(
+            sum(Player.objects.filter(board=board).values_list('games', flat=True)),
+            GameTeamPlayer.objects.filter(team__game__board=board).count()
+        )
+
+
+@override_settings(RATING_RECOMPUTE_MODE='inline', SUBMISSION_BATCH_SIZE=4)
+class SubmissionTests(TransactionTestCase):
+    def setUp(self):
+        self.generator = Generator(players=8, team_sizes=(1, 2), seed=2)
+        self.board = self.generator.create_board('test', 0)
+
+    def submit(self, games, errors):
+        try:
+            for game in games:
+                response = self.client.post(
+                    '/api/boards/test/full_game', json.dumps(game), content_type='application/json'
+                )
+                if response.status_code != 204:
+                    errors.append(response.status_code)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_games(self):
+        games = [{'teams': self.generator.teams_for_game(), 'time': None} for _ in range(24)]
+        errors = []
+        threads = [threading.Thread(target=self.submit, args=(games[index::6], errors)) for index in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Game.objects.filter(board=self.board).count(), 24)
+        self.assertEqual(
+            sum(Player.objects.filter(board=self.board).values_list('games', flat=True)),
+            GameTeamPlayer.objects.filter(team__game__board=self.board).count()
+        )
+
+    def submit_in_thread(self, run, outcomes):
+        def target():
+            try:
+                outcomes.append(submit('test', run))
+            except SubmissionFailed as e:
+                outcomes.append(e)
+            finally:
+                connections.close_all()
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        return thread
+
+    def wait_for_pending(self, count):
+        queue = _queue('test')
+        deadline = time.monotonic() + 5
+        while len(queue.pending) < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    @override_settings(SUBMISSION_BATCH_SIZE=1)
+    def test_leader_writes_one_batch(self):
+        started = threading.Event()
+        release = threading.Event()
+        writers = {}
+
+        def run(name):
+            def write(board):
+                if name == 'first':
+                    started.set()
+                    release.wait(5)
+                writers[name] = threading.current_thread()
+                return name
+            return write
+
+        outcomes = []
+        threads = [self.submit_in_thread(run('first'), outcomes)]
+        self.assertTrue(started.wait(5))
+        for name in ['second', 'third']:
+            threads.append(self.submit_in_thread(run(name), outcomes))
+        self.wait_for_pending(2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['first', 'second', 'third'])
+        # Each request wrote its own submission
+        self.assertEqual(len(set(writers.values())), 3)
+
+    @override_settings(SUBMISSION_TIMEOUT=0.05)
+    def test_waiting_times_out(self):
+        started = threading.Event()
+        release = threading.Event()
+        outcomes = []
+
+        def hold(board):
+            started.set()
+            return release.wait(5)
+
+        leader = self.submit_in_thread(hold, outcomes)
+        self.assertTrue(started.wait(5))
+
+        with self.assertRaises(SubmissionFailed):
+            submit('test', lambda board: 'late')
+        self.assertEqual(_queue('test').pending, [])
+
+        release.set()
+        leader.join()
+        self.assertEqual(outcomes, [True])
+        self.assertEqual(submit('test', lambda board: 'after'), 'after')
+
+    def test_unknown_player(self):
+        game = {'teams': [
+            {'rank': 0, 'players': [{'username': 'player0', 'weight': 1}]},
+            {'rank': 1, 'players': [{'username': 'nobody', 'weight': 1}]},
+        ], 'time': None}
+        response = self.client.post(
+            '/api/boards/test/full_game', json.dumps(game), content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'teams': ['No such player: nobody']})
+        self.assertFalse(Game.objects.filter(board=self.board).exists())
+
+
+class StandInConnection:
+    def __init__(self):
+        self.broken = False
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        if self.broken:
+            raise OSError("connection lost")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class PoolTests(SimpleTestCase):
+    def pool(self, **options):
+        return Pool(**dict({'size': 2, 'timeout': 0.05, 'recycle': 0, 'pre_ping': True}, **options))
+
+    def ping(self, connection):
+        if connection.broken:
+            raise OSError("connection lost")
+
+    def test_reuses_connections(self):
+        pool = self.pool()
+        first = pool.checkout(StandInConnection, self.ping)
+        pool.checkin(first)
+
+        self.assertIs(pool.checkout(StandInConnection, self.ping), first)
+        self.assertEqual(first.rollbacks, 1)
+
+    def test_bounded(self):
+        pool = self.pool()
+        held = [pool.checkout(StandInConnection, self.ping) for _ in range(2)]
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(StandInConnection, self.ping)
+
+        pool.checkin(held[0])
+        self.assertIs(pool.checkout(StandInConnection, self.ping), held[0])
+
+    def test_replaces_broken_and_old_connections(self):
+        pool = self.pool()
+        connection = pool.checkout(StandInConnection, self.ping)
+        pool.checkin(connection)
+        connection.broken = True
+
+        replacement = pool.checkout(StandInConnection, self.ping)
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+
+        pool.recycle = 1e-9
+        pool.checkin(replacement)
+        self.assertIsNot(pool.checkout(StandInConnection, self.ping), replacement)
+        self.assertTrue(replacement.closed)
+
+    def test_failed_checkin_frees_slot(self):
+        pool = self.pool(size=1)
+        connection = pool.checkout(StandInConnection, self.ping)
+        connection.broken = True
+        pool.checkin(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.checkout(StandInConnection, self.ping), connection)
+
+
+class PooledBackendTests(SimpleTestCase):
+    def test_sqlite_connections_are_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = dict(
+                connection.settings_dict,
+                NAME=os.path.join(directory, 'pooled.sqlite3'),
+                POOL={'SIZE': 1, 'TIMEOUT': 0.05},
+            )
+            first = PooledSQLiteWrapper(settings_dict, alias='pooled')
+            second = PooledSQLiteWrapper(settings_dict, alias='pooled')
+
+            with first.cursor() as cursor:
+                cursor.execute('CREATE TABLE numbers (value integer)')
+                cursor.execute('INSERT INTO numbers VALUES (1)')
+            raw = first.connection
+
+            # The only connection is checked out
+            with self.assertRaises(PoolTimeout):
+                second.cursor()
+
+            first.close()
+            with second.cursor() as cursor:
+                cursor.execute('SELECT value FROM numbers')
+                self.assertEqual(cursor.fetchall(), [(1,)])
+            self.assertIs(second.connection, raw)
 
-# Create your tests here.
+            second.close()
+            first.pool.close()
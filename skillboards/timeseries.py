@@ -0,0 +1,48 @@
+# Downsampling for rating history charts.
+
+
+def downsample(xs, ys, max_points):
+    # Largest-Triangle-Three-Buckets: pick at most max_points of the series
+    # that keep its visual shape. The first and last points are always kept,
+    # and every bucket in between contributes the point forming the largest
+    # triangle with the previously chosen point and the average of the next
+    # bucket. Returns the indices of the chosen points, in order.
+    count = len(xs)
+    if max_points >= count:
+        return list(range(count))
+    if max_points < 3:
+        return [0, count - 1][:max_points]
+
+    chosen = [0]
+    bucket_size = (count - 2) / (max_points - 2)
+    previous = 0
+
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_size = next_end - next_start
+        average_x = sum(xs[next_start:next_end]) / next_size
+        average_y = sum(ys[next_start:next_end]) / next_size
+
+        previous_x = xs[previous]
+        previous_y = ys[previous]
+
+        best = start
+        best_area = -1
+        for index in range(start, end):
+            area = abs(
+                (previous_x - average_x) * (ys[index] - previous_y) -
+                (previous_x - xs[index]) * (average_y - previous_y)
+            )
+            if area > best_area:
+                best = index
+                best_area = area
+
+        chosen.append(best)
+        previous = best
+
+    chosen.append(count - 1)
+    return chosen
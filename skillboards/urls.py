@@ -11,9 +11,16 @@ urlpatterns = [
             url(r'^$', views.player_list),
             url(r'^(?P<username>[a-zA-Z0-9_-]+)$', views.player_detail),
             url(r'^(?P<username>[a-zA-Z0-9_-]+)/recent_game$', views.player_recent_game),
+            url(r'^(?P<username>[a-zA-Z0-9_-]+)/history$', views.player_history),
+            url(r'^(?P<username>[a-zA-Z0-9_-]+)/games$', views.player_games),
         ])),
+        url(r'^games$', views.game_list),
+        url(r'^quality$', views.quality_matrix),
+        url(r'^balance$', views.balance_teams),
         url(r'^register$', views.register),
         url(r'^full_game$', views.game),
+        url(r'^full_games$', views.games_import),
+        url(r'^export\.(?P<export_format>ndjson|csv)$', views.games_export),
     ])),
     url(r'^poke$', views.poke),
 ]
@@ -1,18 +1,54 @@
+from urllib.parse import quote
+
+import numpy as np
+import trueskill
+
+from django.conf import settings
 from django.db import transaction
+from django.http import Http404
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from skillboards import calculations as calc
+from skillboards.balance import balance
+from skillboards.cache import ResponseCache
+from skillboards.exporter import EXPORTERS
+from skillboards.importer import ImportFailed
+from skillboards.importer import import_games
+from skillboards.importer import read_csv
+from skillboards.importer import read_ndjson
 from skillboards.models import Board
 from skillboards.models import Game
-from skillboards.models import GameTeamPlayer
 from skillboards.models import Player
+from skillboards.models import RatingHistory
+from skillboards.models import lock_board
+from skillboards.models import request_recompute
+from skillboards.pagination import InvalidCursor
+from skillboards.pagination import keyset_page
+from skillboards.serializers import BalanceSerializer
 from skillboards.serializers import BoardSerializer
+from skillboards.serializers import GamePageQuerySerializer
 from skillboards.serializers import GameSerializer
+from skillboards.serializers import HistoryQuerySerializer
+from skillboards.serializers import PlayerDetailSerializer
+from skillboards.serializers import PlayerListQuerySerializer
 from skillboards.serializers import PlayerRegisterSerializer
-from skillboards.serializers import PlayerSerializer
+from skillboards.serializers import QualityQuerySerializer
+from skillboards.snapshot import get_snapshot
+from skillboards.submissions import SubmissionFailed
+from skillboards.submissions import submit
+from skillboards.timeseries import downsample
+
+
+def get_board_or_404(board_name):
+    try:
+        return Board.get_cached(board_name)
+    except Board.DoesNotExist:
+        raise Http404('No Board matches the given query.')
 
 
 @api_view()
@@ -22,51 +58,201 @@ def poke(request):
 
 @api_view()
 def board_list(request):
-    boards = Board.objects.all()
+    boards = Board.objects.with_ratings_status()
     serializer = BoardSerializer(boards, many=True)
     return Response(serializer.data)
 
 
+def get_snapshot_or_404(board_name):
+    try:
+        return get_snapshot(board_name)
+    except Board.DoesNotExist:
+        raise Http404('No Board matches the given query.')
+
+
 @api_view()
 def board_detail(request, board_name):
-    board = get_object_or_404(Board, name=board_name)
-    serializer = BoardSerializer(board)
-    return Response(serializer.data)
+    snapshot = get_snapshot_or_404(board_name)
+    # Locks start and end with time rather than with the revision
+    return Response(dict(snapshot.board_data, unlock_time=snapshot.board.unlock_time()))
+
 
+leaderboard_cache = ResponseCache(
+    'leaderboard',
+    'LEADERBOARD_CACHE_SIZE',
+    'LEADERBOARD_CACHE_TIMEOUT',
+)
 
+
+# Players in skill order. ?top=N gives the best N players, and ?limit= and
+# ?offset= page through the rest; without them every player is returned.
 @api_view()
 def player_list(request, board_name):
-    board = get_object_or_404(Board, name=board_name)
+    query_serializer = PlayerListQuerySerializer(data=request.GET)
+    if not query_serializer.is_valid():
+        return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    query = query_serializer.validated_data
+    if 'top' in query:
+        limit, offset = query['top'], 0
+    else:
+        limit, offset = query.get('limit'), query['offset']
+
+    snapshot = get_snapshot_or_404(board_name)
     request_user = request.GET.get('as', None)
-    players = Player.objects.filter(board=board_name).with_player_info().enabled()
 
-    if request_user is not None:
-        players = list(players)
-        trueskill_env = board.trueskill_environ()
+    key = '{board}:{generation}:{revision}:{user}:{limit}:{offset}'.format(
+        board=board_name,
+        generation=snapshot.version[0].hex,
+        revision=snapshot.version[1],
+        user=quote(request_user or ''),
+        limit=limit or '',
+        offset=offset,
+    )
+
+    return Response(leaderboard_cache.get(
+        key,
+        lambda: build_player_list(snapshot, request_user, limit, offset)
+    ))
 
-        for player in players:
-            if player.username == request_user:
-                self_rating = player.rating
-                break
 
-        for player in players:
-            player.quality = trueskill_env.quality_1vs1(player.rating, self_rating)
+def build_player_list(snapshot, request_user, limit=None, offset=0):
+    end = None if limit is None else offset + limit
+    players = snapshot.players[offset:end]
 
-    serializer = PlayerSerializer(players, many=True)
+    viewer = snapshot.by_username.get(request_user)
+    if viewer is None:
+        return list(players)
+
+    qualities = calc.quality_1vs1_row(
+        trueskill.Rating(mu=viewer['mu'], sigma=viewer['sigma']),
+        snapshot.mu[offset:end],
+        snapshot.sigma[offset:end],
+        snapshot.board.trueskill_environ(),
+    )
+
+    return [
+        dict(player, quality=quality)
+        for player, quality in zip(players, qualities.tolist())
+    ]
 
-    return Response(serializer.data)
+
+quality_cache = ResponseCache(
+    'quality',
+    'LEADERBOARD_CACHE_SIZE',
+    'LEADERBOARD_CACHE_TIMEOUT',
+)
 
 
 @api_view()
-def player_detail(request, board_name, username):
-    player = get_object_or_404(
-        Player.objects
-        .filter(username=username, board=board_name)
-        .with_player_info()
+def quality_matrix(request, board_name):
+    query_serializer = QualityQuerySerializer(data=request.GET)
+    if not query_serializer.is_valid():
+        return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    top = query_serializer.validated_data.get('top')
+    snapshot = get_snapshot_or_404(board_name)
+
+    # The board's settings and ratings come from the snapshot, so they always
+    # match the version in the key
+    key = '{board}:{generation}:{revision}:{top}'.format(
+        board=board_name,
+        generation=snapshot.version[0].hex,
+        revision=snapshot.version[1],
+        top=top or '',
     )
 
-    serializer = PlayerSerializer(player)
-    return Response(serializer.data)
+    return Response(quality_cache.get(key, lambda: build_quality_matrix(snapshot, top)))
+
+
+def build_quality_matrix(snapshot, top):
+    # Enabled players, by username rather than in leaderboard order
+    order = sorted(range(len(snapshot.players)), key=lambda index: snapshot.players[index]['username'])
+    players = [snapshot.players[index] for index in order]
+    usernames = [player['username'] for player in players]
+
+    quality = calc.quality_1vs1_matrix(
+        snapshot.mu[order],
+        snapshot.sigma[order],
+        snapshot.board.trueskill_environ(),
+    )
+
+    if top is None:
+        return {'players': usernames, 'quality': quality.tolist()}
+
+    # Each player's best `top` partners, not counting themselves
+    count = min(top, len(players) - 1)
+    if count < 1:
+        return {'players': usernames, 'top': {username: [] for username in usernames}}
+
+    np.fill_diagonal(quality, -1)
+    rows = np.arange(len(players))[:, None]
+    partners = np.argpartition(-quality, count - 1, axis=1)[:, :count]
+    partners = partners[rows, np.argsort(-quality[rows, partners], axis=1)]
+
+    return {
+        'players': usernames,
+        'top': {
+            username: [
+                {'username': usernames[partner], 'quality': quality[index, partner]}
+                for partner in row
+            ]
+            for index, (username, row) in enumerate(zip(usernames, partners.tolist()))
+        },
+    }
+
+
+@api_view(["POST"])
+def balance_teams(request, board_name):
+    serializer = BalanceSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    request_data = serializer.validated_data
+    usernames = request_data['players']
+
+    board = get_board_or_404(board_name)
+    players = {
+        player.username: player
+        for player in board.players.filter(username__in=usernames).only('username', 'mu', 'sigma')
+    }
+
+    missing = [username for username in usernames if username not in players]
+    if missing:
+        return Response({
+            'players': [f'No such player: {username}' for username in missing]
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    exact, splits = balance(
+        [players[username].rating for username in usernames],
+        request_data['teams'],
+        board.trueskill_environ().beta,
+        top=request_data['top'],
+        time_budget=settings.BALANCE_TIME_BUDGET,
+    )
+
+    return Response({
+        'exact': exact,
+        'splits': [
+            {
+                'quality': quality,
+                'teams': [[usernames[index] for index in team] for team in teams],
+            }
+            for quality, teams in splits
+        ],
+    })
+
+
+@api_view()
+def player_detail(request, board_name, username):
+    snapshot = get_snapshot_or_404(board_name)
+
+    try:
+        player = snapshot.by_username[username]
+    except KeyError:
+        raise Http404('No Player matches the given query.')
+
+    return Response(dict(player, standing=snapshot.standing(username)))
 
 
 @api_view()
@@ -77,20 +263,109 @@ def player_recent_game(request, board_name, username):
 
     try:
         game = (
-            GameTeamPlayer.objects
-            .filter(player=player)
-            .latest('team__game__time')
-            .team.game
+            Game.objects
+            .filter(teams__players__player=player)
+            .prefetch_related('teams__players__player')
+            .latest('time')
         )
-    except GameTeamPlayer.DoesNotExist:
+    except Game.DoesNotExist:
         return Response(status=status.HTTP_204_NO_CONTENT)
     else:
         serializer = GameSerializer(game)
         return Response(serializer.data)
 
 
+def game_page(request, games):
+    query_serializer = GamePageQuerySerializer(data=request.GET)
+    if not query_serializer.is_valid():
+        return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    query = query_serializer.validated_data
+
+    try:
+        page, next_cursor = keyset_page(
+            games.prefetch_related('teams__players__player'),
+            query.get('cursor'),
+            query['limit'],
+        )
+    except InvalidCursor:
+        return Response({'cursor': ['Invalid cursor']}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'games': GameSerializer(page, many=True).data,
+        'next': next_cursor,
+    })
+
+
+@api_view()
+def game_list(request, board_name):
+    board = get_board_or_404(board_name)
+    return game_page(request, Game.objects.filter(board=board))
+
+
+@api_view()
+def player_games(request, board_name, username):
+    player = get_object_or_404(
+        Player.objects.only('pk'),
+        username=username,
+        board=board_name
+    )
+    return game_page(request, Game.objects.filter(teams__players__player=player))
+
+
+@api_view()
+def player_history(request, board_name, username):
+    query_serializer = HistoryQuerySerializer(data=request.GET)
+    if not query_serializer.is_valid():
+        return Response(query_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    query = query_serializer.validated_data
+
+    # With the board's current settings rather than the process's cached ones
+    player = get_object_or_404(
+        Player.objects.select_related('board').only('pk', 'board__mu', 'board__sigma'),
+        username=username,
+        board=board_name
+    )
+
+    history = RatingHistory.objects.filter(player=player)
+    if 'start' in query:
+        history = history.filter(time__gte=query['start'])
+    if 'end' in query:
+        history = history.filter(time__lt=query['end'])
+
+    history = list(history.order_by('time', 'game_id').values_list('time', 'mu', 'sigma'))
+
+    skill_factor = player.board.mu / player.board.sigma
+    skills = [mu - sigma * skill_factor for _, mu, sigma in history]
+    chosen = downsample([time.timestamp() for time, _, _ in history], skills, query['points'])
+
+    return Response({
+        'total': len(history),
+        'points': [
+            {
+                'time': history[index][0],
+                'mu': history[index][1],
+                'sigma': history[index][2],
+                'skill': skills[index],
+            }
+            for index in chosen
+        ],
+    })
+
+
+def locked_response(unlock_time):
+    return Response({
+        'detail': "Board is locked",
+        'unlock_time': unlock_time,
+    }, status=status.HTTP_423_LOCKED)
+
+
+def unavailable_response(error):
+    return Response({'detail': str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 @api_view(["POST"])
-@transaction.atomic
 def register(request, board_name):
     register_serializer = PlayerRegisterSerializer(data=request.data)
     if not register_serializer.is_valid():
@@ -99,65 +374,159 @@ def register(request, board_name):
     username = register_serializer.data['username']
     print_name = register_serializer.data['print_name']
 
-    board = get_object_or_404(Board.objects.only('mu', 'sigma'), name=board_name)
+    board = get_board_or_404(board_name)
 
-    try:
-        player = board.players.with_player_info().get(username=username)
-
-    except Player.DoesNotExist:
-        # Player doesn't exist; create a new one
-        if not print_name:
-            return Response({
-                'print_name': "Player doesn't exist; must provide print_name"
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        player = Player.create(
-            username=username,
-            print_name=print_name,
-            board=board
-        )
-        player.full_clean()
-        player.save()
+    # Signing in as an existing player doesn't write anything, so it's
+    # allowed while the board is locked
+    player = board.players.filter(username=username).first()
+    if player is not None and (not print_name or player.print_name == print_name):
+        return Response(PlayerDetailSerializer(player).data, status=status.HTTP_200_OK)
 
-        # Re-fetch to get annotation fields
-        player = board.players.with_player_info().get(username=username)
+    unlock_time = board.unlock_time()
+    if unlock_time is not None:
+        return locked_response(unlock_time)
 
-        code = status.HTTP_201_CREATED
+    def save(board):
+        try:
+            player = board.players.get(username=username)
+
+        except Player.DoesNotExist:
+            # Player doesn't exist; create a new one
+            if not print_name:
+                return None, status.HTTP_400_BAD_REQUEST
+
+            player = Player.create(
+                username=username,
+                print_name=print_name,
+                board=board
+            )
+            player.full_clean()
+            player.save()
+            Board.bump_revision(board_name)
+
+            return player, status.HTTP_201_CREATED
 
-    else:
         # Player already exists; update the print_name if given
         if print_name and player.print_name != print_name:
             player.print_name = print_name
             player.full_clean()
             player.save()
+            Board.bump_revision(board_name)
 
-        code = status.HTTP_200_OK
+        return player, status.HTTP_200_OK
 
-    player_serializer = PlayerSerializer(player)
+    try:
+        player, code = submit(board_name, save)
+    except SubmissionFailed as e:
+        return unavailable_response(e)
+    if player is None:
+        return Response({
+            'print_name': "Player doesn't exist; must provide print_name"
+        }, status=code)
+
+    player_serializer = PlayerDetailSerializer(player)
     return Response(player_serializer.data, status=code)
 
 
-# TODO: add board locks
 @api_view(["POST"])
-@transaction.atomic
 def game(request, board_name):
     serializer = GameSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     request_data = serializer.data
+    time = serializer.validated_data['time']
+
+    board = get_board_or_404(board_name)
+
+    # Games can't be submitted while the board is locked, nor backdated into
+    # a locked period
+    for when in (None, time):
+        unlock_time = board.unlock_time(when)
+        if unlock_time is not None:
+            return locked_response(unlock_time)
+
+    usernames = {
+        player['username']
+        for team in request_data['teams']
+        for player in team['players']
+    }
+
+    def create(board):
+        players = {
+            player.username: player
+            for player in board.players.filter(username__in=usernames)
+        }
+
+        missing = sorted(usernames - set(players))
+        if missing:
+            return missing
+
+        teams = [
+            (
+                team['rank'],
+                [(players[player['username']], player['weight']) for player in team['players']]
+            ) for team in request_data['teams']
+        ]
+
+        Game.create_game(board=board, teams=teams, time=time)
 
-    board = get_object_or_404(Board, name=board_name)
-
-    teams = (
-        (
-            team['rank'],
-            ((
-                board.players.get(username=player['username']),
-                player['weight'],
-            ) for player in team['players'])
-        ) for team in request_data['teams'])
+    try:
+        missing = submit(board_name, create)
+    except SubmissionFailed as e:
+        return unavailable_response(e)
 
-    Game.create_game(board=board, teams=teams, time=request_data['time'])
+    if missing:
+        return Response({
+            'teams': [f'No such player: {username}' for username in missing]
+        }, status=status.HTTP_400_BAD_REQUEST)
 
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Many games at once, either as a JSON list or as newline-delimited JSON
+# (application/x-ndjson) with one game per line. The board's ratings are
+# replayed once afterwards.
+@api_view(["POST"])
+@transaction.atomic
+def games_import(request, board_name):
+    board = get_board_or_404(board_name)
+    lock_board(board_name)
+
+    # As with single games; games backdated into a locked period are
+    # rejected by import_games
+    unlock_time = board.unlock_time()
+    if unlock_time is not None:
+        return locked_response(unlock_time)
+
+    if request.content_type.startswith('application/x-ndjson'):
+        games = read_ndjson(request.stream or [])
+    elif request.content_type.startswith('text/csv'):
+        games = read_csv(request.stream or [])
+    elif isinstance(request.data, list):
+        games = enumerate(request.data, 1)
+    else:
+        return Response({
+            'errors': 'Expected a list of games, newline-delimited JSON or CSV'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        count, earliest = import_games(board, games)
+    except ImportFailed as e:
+        transaction.set_rollback(True)
+        return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    if count:
+        request_recompute(board.pk, earliest)
+
+    return Response({'games': count}, status=status.HTTP_201_CREATED)
+
+
+@api_view()
+def games_export(request, board_name, export_format):
+    board = get_board_or_404(board_name)
+    export, content_type = EXPORTERS[export_format]
+
+    response = StreamingHttpResponse(export(board), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{board_name}.{export_format}"'
+    return response
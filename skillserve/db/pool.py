@@ -0,0 +1,142 @@
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+# A bounded pool of database connections shared by every greenlet (or thread)
+# in a process. Django opens a connection for each greenlet that touches the
+# database and, with CONN_MAX_AGE = 0, closes it when the request finishes;
+# the pooled backends check connections out of here instead and hand them
+# back on close, so short requests don't pay for connection setup.
+#
+# Options, from the database's POOL settings:
+#   SIZE      most connections open at once; further checkouts wait
+#   TIMEOUT   seconds to wait for a free connection before failing
+#   RECYCLE   seconds after which a connection is replaced (0 for never)
+#   PRE_PING  whether to run a trivial query on idle connections before reuse
+
+DEFAULTS = {
+    'SIZE': 10,
+    'TIMEOUT': 10.0,
+    'RECYCLE': 3600.0,
+    'PRE_PING': True,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class Pool:
+    def __init__(self, *, size, timeout, recycle, pre_ping):
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.slots = threading.BoundedSemaphore(size)
+        # (connection, created) pairs; the most recently used is reused first
+        self.idle = []
+        self.checked_out = {}
+
+    # Returns an idle connection, or a new one from `connect()` if there are
+    # none. `ping(connection)` should raise if the connection is unusable.
+    def checkout(self, connect, ping):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No database connection free after {self.timeout} seconds")
+
+        try:
+            connection, created = self._take(ping)
+            if connection is None:
+                connection, created = connect(), time.monotonic()
+        except BaseException:
+            self.slots.release()
+            raise
+
+        self.checked_out[id(connection)] = created
+        return connection
+
+    def _take(self, ping):
+        now = time.monotonic()
+        while self.idle:
+            connection, created = self.idle.pop()
+            if self.recycle and now - created > self.recycle:
+                _close_quietly(connection)
+                continue
+
+            if self.pre_ping:
+                try:
+                    ping(connection)
+                except Exception:
+                    _close_quietly(connection)
+                    continue
+
+            return connection, created
+        return None, None
+
+    def checkin(self, connection):
+        try:
+            created = self.checked_out.pop(id(connection))
+            # Don't pass on an open transaction; a connection that can't even
+            # roll back is broken
+            try:
+                connection.rollback()
+            except Exception:
+                _close_quietly(connection)
+            else:
+                self.idle.append((connection, created))
+        finally:
+            self.slots.release()
+
+    def close(self):
+        while self.idle:
+            connection, _ = self.idle.pop()
+            _close_quietly(connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    # The test runner points an alias at a different database, so pools are
+    # per set of connection parameters
+    key = (alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = dict(DEFAULTS, **options)
+            pool = _pools[key] = Pool(
+                size=options['SIZE'],
+                timeout=options['TIMEOUT'],
+                recycle=options['RECYCLE'],
+                pre_ping=options['PRE_PING'],
+            )
+        return pool
+
+
+class PooledDatabaseWrapperMixin:
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        self.pool = get_pool(self.alias, conn_params, self.settings_dict.get('POOL', {}))
+        return self.pool.checkout(lambda: connect(conn_params), self.ping_connection)
+
+    def ping_connection(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
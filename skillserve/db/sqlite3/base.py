@@ -0,0 +1,11 @@
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.sqlite3 import base
+
+from skillserve.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    # Django never closes in-memory databases, since that would destroy
+    # them, but handing the connection back to the pool doesn't
+    def close(self):
+        BaseDatabaseWrapper.close(self)
@@ -67,12 +67,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'skillboards.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'skillboards.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -112,6 +114,48 @@ DATABASES = {
 db_from_env = dj_database_url.config()
 DATABASES['default'].update(db_from_env)
 
+# Share a bounded pool of connections between the greenlets of each worker
+# instead of connecting for every request. DB_POOL_SIZE is the most
+# connections a worker opens, and 0 turns pooling off. Requests wait up to
+# DB_POOL_TIMEOUT seconds for a free connection. Idle connections are checked
+# with a trivial query before reuse (DB_POOL_PRE_PING) and replaced after
+# DB_POOL_RECYCLE seconds.
+POOLED_ENGINES = {
+    'django.db.backends.postgresql': 'skillserve.db.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'skillserve.db.postgresql',
+    'django.db.backends.sqlite3': 'skillserve.db.sqlite3',
+}
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+if DB_POOL_SIZE:
+    DATABASES['default'].update({
+        'ENGINE': POOLED_ENGINES[DATABASES['default']['ENGINE']],
+        # Connections go back to the pool when each request finishes
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'RECYCLE': float(os.environ.get('DB_POOL_RECYCLE', 3600)),
+            'PRE_PING': environ_get_bool('DB_POOL_PRE_PING', default=True),
+        },
+    })
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'skillserve'),
+    }
+}
+
+# Rendered leaderboards kept in memory by each process, and the number of
+# seconds they're kept in the shared cache. Entries are keyed by the board's
+# revision, so they never go stale.
+LEADERBOARD_CACHE_SIZE = int(os.environ.get('LEADERBOARD_CACHE_SIZE', 256))
+LEADERBOARD_CACHE_TIMEOUT = int(os.environ.get('LEADERBOARD_CACHE_TIMEOUT', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
@@ -150,6 +194,53 @@ CSRF_COOKIE_SECURE = not DEBUG
 SESSION_COOKIE_SECURE = not DEBUG
 CONN_MAX_AGE = 60
 
+# Number of games between saved rating checkpoints on each board. Backdated
+# and deleted games only replay from the nearest checkpoint. 0 disables them.
+RATING_CHECKPOINT_INTERVAL = int(os.environ.get('RATING_CHECKPOINT_INTERVAL', 100))
+
+# Gaussian backend for TrueSkill calculations on boards that don't set their
+# own: 'table' (built in, no scipy needed) or 'scipy'.
+TRUESKILL_BACKEND = os.environ.get('TRUESKILL_BACKEND', 'table')
+
+# How replays of a board's ratings (after a backdated or deleted game) run:
+# 'background' runs them in a worker thread (a greenlet under gevent) after
+# the request commits, 'command' leaves them for `manage.py
+# recompute_ratings`, and 'inline' runs them immediately.
+RATING_RECOMPUTE_MODE = os.environ.get('RATING_RECOMPUTE_MODE', 'background')
+
+# Seconds after which a replay claimed by a worker that never finished it may
+# be picked up again.
+RATING_RECOMPUTE_TIMEOUT = int(os.environ.get('RATING_RECOMPUTE_TIMEOUT', 600))
+
+# Seconds that each worker process may cache a board's configuration.
+# Changes made in one process are seen immediately there, and by the other
+# processes after at most this long.
+BOARD_CACHE_TIMEOUT = int(os.environ.get('BOARD_CACHE_TIMEOUT', 60))
+
+# Seconds the team balancer may spend searching when a group is too large to
+# try every split.
+BALANCE_TIME_BUDGET = float(os.environ.get('BALANCE_TIME_BUDGET', 0.25))
+
+# Record request latency, SQL queries and rating engine timings, and serve
+# them at /metrics in Prometheus' text format.
+METRICS_ENABLED = environ_get_bool('METRICS_ENABLED', default=True)
+
+# Most games and registrations that one process writes to a board in a single
+# transaction. Writes that arrive while a batch is being written wait for the
+# next one.
+SUBMISSION_BATCH_SIZE = int(os.environ.get('SUBMISSION_BATCH_SIZE', 50))
+
+# Seconds a game or registration waits for its turn to be written before the
+# request fails with a 503.
+SUBMISSION_TIMEOUT = float(os.environ.get('SUBMISSION_TIMEOUT', 20))
+
+# Let staff users profile a request with an `X-Profile: 1` header or a
+# `profile=1` query parameter. The newest PROFILE_KEEP profiles are kept in
+# PROFILE_DIR and can be browsed in the admin.
+PROFILING_ENABLED = environ_get_bool('PROFILING_ENABLED', default=False)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/1.11/howto/static-files/
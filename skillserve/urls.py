@@ -16,15 +16,20 @@ Including another URLconf
 
 from logging_tree.format import build_description
 
+from django.conf import settings
 from django.conf.urls import include
 from django.conf.urls import url
 from django.contrib import admin
+from django.http import Http404
+from django.http import HttpResponse
 
 from rest_framework import renderers
 from rest_framework.decorators import api_view
 from rest_framework.decorators import renderer_classes
 from rest_framework.response import Response
 
+from skillboards import metrics
+
 
 class PlainTextRenderer(renderers.BaseRenderer):
     media_type = 'text/plain'
@@ -40,7 +45,14 @@ def log_tree(request):
     return Response(build_description())
 
 
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 urlpatterns = [
+    url(r'^metrics$', metrics_view),
     url(r'^api/', include('skillboards.urls')),
     url(r'^admin/', admin.site.urls),
     url(r'^', include('skillstatic.urls'))